@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     chunkedload.py
+#
+#     Compare the JSON decoding work of loading the largest page of a .sketch
+#     file in chunks, as SketchBuilder.loadPages(artboardChunks=n) does, with
+#     every chunk decoding the whole page (the previous implementation), or
+#     only its own part of the scanned layer texts.
+#
+#     python3 Benchmarks/chunkedload.py ["PageBot Elements.sketch"] [--chunks 4] [--document]
+#
+#     The decode times are measured in this process, one chunk after the
+#     other: "work" is the sum of all chunks, "wall" the scan plus the
+#     slowest chunk, as with one process per chunk. With --document, the
+#     real SketchBuilder.loadPages is timed, which needs pagebot and pysketch.
+#
+import json
+import os
+import sys
+import time
+import zipfile
+
+from pagebotsketch.sketchzip import pageMembers, iterPageLayers, pageLayerTexts, splitTexts
+
+def timed(f, *args):
+    t = time.perf_counter()
+    result = f(*args)
+    return time.perf_counter() - t, result
+
+def decodeStrided(path, member, index, step):
+    """Previous chunk task: decode all layers, keep every @step one."""
+    return [d for layerIndex, d in enumerate(iterPageLayers(path, member))
+        if layerIndex % step == index]
+
+def decodeTexts(texts):
+    return [json.loads(text) for text in texts]
+
+def report(label, work, wall):
+    print('%-28s work %8.1f ms   wall %8.1f ms' % (label, work*1000, wall*1000))
+
+def loadPages(path, chunks):
+    from pagebotsketch.sketchbuilder import SketchBuilder
+    b = SketchBuilder(path, lazy=True)
+    b.loadPages(artboardChunks=chunks)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    chunks = 4
+    if '--chunks' in args:
+        chunks = int(args[args.index('--chunks') + 1])
+    paths = [arg for arg in args if arg.endswith('.sketch')]
+    path = paths[0] if paths else os.path.join(os.path.dirname(__file__), '..', 'PageBot Elements.sketch')
+    with zipfile.ZipFile(path) as zf:
+        member = max(pageMembers(zf), key=lambda item: zf.getinfo(item[0]).file_size)[0]
+    print('%s, %d chunks' % (os.path.basename(path), chunks))
+
+    times = [timed(decodeStrided, path, member, index, chunks)[0] for index in range(chunks)]
+    report('decode whole page per chunk', sum(times), max(times))
+
+    scan, (_, texts) = timed(pageLayerTexts, path, member)
+    times = [timed(decodeTexts, part)[0] for part in splitTexts(texts, chunks)]
+    report('scan + decode own part', scan + sum(times), scan + max(times))
+
+    if '--document' in args:
+        for n in (1, chunks):
+            t, _ = timed(loadPages, path, n)
+            print('%-28s %8.1f ms' % ('loadPages(artboardChunks=%d)' % n, t*1000))
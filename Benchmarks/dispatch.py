@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     dispatch.py
+#
+#     Compare the cost of selecting the layer conversion by the former
+#     isinstance chain with the SketchContext.getLayerHandler dispatch table,
+#     on a deep synthetic tree of Sketch layers.
+#
+#     python3 Benchmarks/dispatch.py [depth] [width]
+#
+import sys
+import time
+
+from pysketch.sketchclasses import (SketchGroup, SketchShapeGroup, SketchRectangle,
+    SketchOval, SketchText, SketchBitmap, SketchSymbolInstance, SketchShapePath)
+from pagebotsketch.sketchcontext import SketchContext
+
+LEAF_CLASSES = (SketchRectangle, SketchOval, SketchText, SketchBitmap,
+    SketchSymbolInstance, SketchShapePath)
+
+def makeTree(depth, width):
+    """Answer a group with @depth levels of nested groups, each level holding
+    @width leaves of all layer classes, the last one unsupported.
+    """
+    root = group = SketchGroup()
+    for level in range(depth):
+        group.layers = [LEAF_CLASSES[n % len(LEAF_CLASSES)]() for n in range(width)]
+        child = SketchShapeGroup() if level % 2 else SketchGroup() # Alternate the group classes.
+        group.layers.append(child)
+        group = child
+    group.layers = []
+    return root
+
+def allLayers(root):
+    layers = []
+    stack = [root]
+    while stack:
+        layer = stack.pop()
+        layers.append(layer)
+        stack.extend(getattr(layer, 'layers', None) or [])
+    return layers
+
+def chain(layer):
+    # Former order of the isinstance chain in SketchContext._createElements
+    if isinstance(layer, (SketchGroup, SketchShapeGroup)):
+        return 'group'
+    elif isinstance(layer, SketchRectangle):
+        return 'rect'
+    elif isinstance(layer, SketchOval):
+        return 'oval'
+    elif isinstance(layer, SketchText):
+        return 'text'
+    elif isinstance(layer, SketchBitmap):
+        return 'image'
+    elif isinstance(layer, SketchSymbolInstance):
+        return 'symbol'
+    return None
+
+def run(f, layers, repeat=10):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        for layer in layers:
+            f(layer)
+    return (time.perf_counter() - t) / repeat / len(layers)
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    layers = allLayers(makeTree(depth, width))
+    context = SketchContext()
+    print('%d layers, depth %d' % (len(layers), depth))
+    print('isinstance chain %8.1f ns/layer' % (run(chain, layers)*1e9))
+    print('dispatch table   %8.1f ns/layer' % (run(context.getLayerHandler, layers)*1e9))
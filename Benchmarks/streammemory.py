@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     streammemory.py
+#
+#     Compare the peak memory of decoding the page members of a .sketch file
+#     as a whole with streaming them artboard by artboard.
+#
+#     python3 Benchmarks/streammemory.py ["PageBot Elements.sketch"] [--document]
+#
+#     With --document, the complete SketchContext.readDocument is measured,
+#     eager and lazy + stream, which needs pagebot and pysketch installed.
+#
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zipfile
+
+from pagebotsketch.sketchzip import pageMembers, iterPageLayers
+
+def measure(f, *args):
+    """Answer (seconds, peakBytes) of calling f(*args)."""
+    tracemalloc.start()
+    t = time.perf_counter()
+    f(*args)
+    t = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t, peak
+
+def decodeWhole(path):
+    with zipfile.ZipFile(path) as zf:
+        for member, _, _ in pageMembers(zf):
+            page = json.loads(zf.read(member))
+            for artboard in page['layers']:
+                pass
+
+def decodeStream(path):
+    with zipfile.ZipFile(path) as zf:
+        for member, _, _ in pageMembers(zf):
+            for artboard in iterPageLayers(zf, member):
+                pass
+
+def readDocument(path, lazy, stream):
+    from pagebot.document import Document
+    from pagebotsketch.sketchcontext import SketchContext
+    context = SketchContext(path, lazy=lazy)
+    context.readDocument(Document(), stream=stream)
+
+def report(label, result):
+    t, peak = result
+    print('%-28s %8.1f ms %10.1f MB peak' % (label, t*1000, peak/1024/1024))
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    path = args[0] if args else os.path.join(os.path.dirname(__file__), '..', 'PageBot Elements.sketch')
+    print(os.path.basename(path))
+    report('json.loads whole page', measure(decodeWhole, path))
+    report('iterPageLayers stream', measure(decodeStream, path))
+    if '--document' in sys.argv:
+        report('readDocument eager', measure(readDocument, path, False, False))
+        report('readDocument lazy+stream', measure(readDocument, path, True, True))
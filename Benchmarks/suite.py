@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     suite.py
+#
+#     Benchmarks of the main operations on synthetic .sketch files of
+#     increasing size (see pagebotsketch.sketchgenerate), compared with stored
+#     baselines.
+#
+#     python3 Benchmarks/suite.py [--sizes small,medium] [--repeat 3]
+#     python3 Benchmarks/suite.py --update      Store the results as baseline
+#
+#     A benchmark that is slower than its baseline by more than --threshold
+#     (default 0.25, i.e. 25%) is reported as regression, and the exit status
+#     is 1. Benchmarks that need pagebot and pysketch are skipped when they
+#     are not installed. Baselines depend on the machine, so store them on the
+#     machine that runs the comparison.
+#
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pagebotsketch.sketchcompare import compareSketchFiles
+from pagebotsketch.sketchgenerate import generateSketch
+from pagebotsketch.sketchimages import probeImages
+from pagebotsketch.sketchzip import pageMembers, iterPageLayers, readJson, encodeJson, rewriteArchive
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_THRESHOLD = 0.25
+
+SIZES = dict(
+    small=dict(pages=1, artboards=4, layers=50, depth=3, textRuns=3, bitmaps=4),
+    medium=dict(pages=4, artboards=10, layers=100, depth=4, textRuns=4, bitmaps=20),
+    large=dict(pages=8, artboards=20, layers=200, depth=5, textRuns=5, bitmaps=50),
+)
+
+def best(f, repeat):
+    """Answer the shortest time in seconds of @repeat calls of f()."""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+def changedCopy(path, tmpDir):
+    """Answer the path of a copy of @path with one renamed artboard."""
+    member = pageMembers(path)[0][0]
+    d = readJson(path, member)
+    d['layers'][0]['name'] += ' changed'
+    changedPath = os.path.join(tmpDir, 'changed.sketch')
+    rewriteArchive(path, changedPath, {member: encodeJson(d)})
+    return changedPath, member, encodeJson(d)
+
+def scan(path):
+    for member, _, _ in pageMembers(path):
+        for _ in iterPageLayers(path, member):
+            pass
+
+def benchmarks(path, tmpDir):
+    """Answer the list of (name, function) to time for the file @path."""
+    changedPath, member, data = changedCopy(path, tmpDir)
+    savePath = os.path.join(tmpDir, 'saved.sketch')
+    items = [
+        ('scan', lambda: scan(path)),
+        ('probeImages', lambda: probeImages(path)),
+        ('compare', lambda: compareSketchFiles(path, changedPath)),
+        ('rewriteOnePage', lambda: rewriteArchive(path, savePath, {member: data})),
+    ]
+    try:
+        from pagebot.document import Document
+        from pagebotsketch.sketchbuilder import SketchBuilder
+        from pagebotsketch.sketchcontext import SketchContext
+    except ImportError as e:
+        print('    (skipping pagebot benchmarks: %s)' % e)
+        return items
+
+    def babel():
+        context = SketchContext(path)
+        texts = context.convertAllText()
+        context.writeAllText(texts)
+
+    def save(incremental):
+        context = SketchContext(path)
+        context.b.touch(context.b.pages[0])
+        context.save(savePath, incremental=incremental)
+
+    items += [
+        ('open', lambda: SketchBuilder(path)),
+        ('openLazy', lambda: SketchBuilder(path, lazy=True).pages),
+        ('readDocument', lambda: SketchContext(path).readDocument(Document())),
+        ('readDocumentStream', lambda: SketchContext(path, lazy=True).readDocument(Document(), stream=True)),
+        ('babelString', babel),
+        ('save', lambda: save(False)),
+        ('saveIncremental', lambda: save(True)),
+    ]
+    return items
+
+def run(sizes, repeat):
+    """Answer the results {size: {benchmark: seconds}}."""
+    results = {}
+    tmpDir = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            path = os.path.join(tmpDir, size + '.sketch')
+            t = time.perf_counter()
+            counts = generateSketch(path, **SIZES[size])
+            results[size] = sizeResults = dict(generate=time.perf_counter() - t)
+            print('%s: %d pages, %d artboards, %d layers, %d images, %0.1f MB' % (size,
+                counts['pages'], counts['artboards'], counts['layers'], counts['images'],
+                os.path.getsize(path) / 1024 / 1024))
+            for name, f in benchmarks(path, tmpDir):
+                sizeResults[name] = best(f, repeat)
+    finally:
+        shutil.rmtree(tmpDir)
+    return results
+
+def compare(results, baselines, threshold):
+    """Print the results against the @baselines. Answer the list of
+    (size, benchmark, ratio) of the regressions beyond @threshold.
+    """
+    regressions = []
+    for size, sizeResults in results.items():
+        print(size)
+        for name, seconds in sizeResults.items():
+            baseline = baselines.get(size, {}).get(name)
+            if baseline:
+                ratio = seconds / baseline
+                flag = ''
+                if ratio > 1 + threshold:
+                    flag = 'REGRESSION'
+                    regressions.append((size, name, ratio))
+                print('    %-20s %9.2f ms %9.2f ms %6.2fx %s' % (name, seconds*1000, baseline*1000, ratio, flag))
+            else:
+                print('    %-20s %9.2f ms %12s' % (name, seconds*1000, 'no baseline'))
+    return regressions
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of pagebotsketch on synthetic .sketch files.')
+    parser.add_argument('--sizes', default='small,medium', help='comma separated of %s' % ', '.join(SIZES))
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the fastest counts')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed slowdown ratio')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of the baselines JSON file')
+    parser.add_argument('--update', action='store_true', help='store the results as new baselines')
+    options = parser.parse_args(args)
+
+    sizes = options.sizes.split(',')
+    for size in sizes:
+        if size not in SIZES:
+            parser.error('unknown size "%s"' % size)
+    results = run(sizes, options.repeat)
+    baselines = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, options.threshold)
+    if options.update:
+        for size, sizeResults in results.items():
+            baselines.setdefault(size, {}).update(sizeResults)
+        with open(options.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baselines stored in %s' % options.baseline)
+        return 0
+    if regressions:
+        print('%d regression(s) beyond %d%%' % (len(regressions), options.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
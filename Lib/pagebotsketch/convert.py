@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     convert.py
+#
+#     Bulk conversion of .sketch files into PageBot documents, installed as
+#     the pagebotsketch-convert command:
+#
+#     pagebotsketch-convert designs/ "archive/**/*.sketch" -j 8 -o _export -e .pdf --json summary.json
+#
+#     The files are divided over a pool of worker processes, that stay alive
+#     for the whole run, so the imports of pagebot and pysketch are done once
+#     per worker. A file that fails does not stop the others.
+#
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+SKETCH_EXTENSION = '.sketch'
+PHASES = ('open', 'read', 'export')
+
+def collectFiles(inputs):
+    """Answer the sorted list of .sketch files for the @inputs, which can be
+    files, directories (searched recursively) or glob patterns.
+
+    >>> import tempfile
+    >>> root = tempfile.mkdtemp()
+    >>> for fileName in ('a.sketch', 'b.txt', 'sub/c.sketch'):
+    ...     os.makedirs(os.path.dirname(os.path.join(root, fileName)), exist_ok=True)
+    ...     open(os.path.join(root, fileName), 'w').close()
+    >>> [os.path.relpath(path, root) for path in collectFiles([root, root + '/*.sketch'])]
+    ['a.sketch', 'sub/c.sketch']
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '**', '*' + SKETCH_EXTENSION), recursive=True))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(path for path in glob.glob(item, recursive=True)
+                if path.endswith(SKETCH_EXTENSION) and os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in paths)
+
+def warmUp():
+    """Initializer of the worker processes, importing the modules once. An
+    import error is reported by convertFile for every file, as an exception
+    in the initializer would break the pool.
+    """
+    try:
+        import pagebot.document
+        import pagebotsketch.sketchcontext
+    except ImportError:
+        pass
+
+def convertFile(path, outputDir=None, extension=None, lazy=False, stream=False):
+    """Convert the .sketch file @path into a PageBot Document, optionally
+    exported to @outputDir with @extension (e.g. '.pdf'). Answer a result
+    dictionary, with the error message instead of raising an exception, so
+    a failing file does not stop the others.
+    """
+    result = dict(path=path, ok=False, error=None, pages=0, layers=0,
+        phases={phase: 0 for phase in PHASES}, seconds=0)
+    start = time.perf_counter()
+    t = start
+    phase = 'open'
+    try:
+        from pagebot.document import Document
+        from pagebotsketch.sketchcontext import SketchContext
+        context = SketchContext(path, lazy=lazy, stats=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        doc = Document(name=name)
+        t = _endPhase(result, phase, t)
+        phase = 'read'
+        context.readDocument(doc, stream=stream)
+        # Counted while reading, as streamed artboards are not kept.
+        result['layers'] = context.stats['layers'].items
+        result['pages'] = len(doc.pages)
+        t = _endPhase(result, phase, t)
+        if outputDir is not None and extension is not None:
+            phase = 'export'
+            doc.export(os.path.join(outputDir, name + extension))
+            t = _endPhase(result, phase, t)
+        result['ok'] = True
+    except Exception as e:
+        _endPhase(result, phase, t)
+        result['error'] = '%s in %s: %s' % (e.__class__.__name__, phase, e)
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def _endPhase(result, phase, t):
+    now = time.perf_counter()
+    result['phases'][phase] += now - t
+    return now
+
+def summarize(results, seconds):
+    """Answer the summary dictionary of the list of @results, converted in
+    @seconds wall time.
+
+    >>> results = [dict(path='a', ok=True, error=None, pages=2, layers=100, phases=dict(open=1, read=2, export=0), seconds=3),
+    ...     dict(path='b', ok=False, error='ValueError in read: x', pages=0, layers=0, phases=dict(open=1, read=0, export=0), seconds=1)]
+    >>> summary = summarize(results, 2)
+    >>> summary['files'], summary['failed'], summary['filesPerSecond'], summary['layersPerSecond'], summary['phases']
+    (2, 1, 1.0, 50.0, {'open': 2, 'read': 2, 'export': 0})
+    """
+    layers = sum(result['layers'] for result in results)
+    phases = {phase: sum(result['phases'].get(phase, 0) for result in results) for phase in PHASES}
+    return dict(
+        files=len(results),
+        failed=sum(1 for result in results if not result['ok']),
+        pages=sum(result['pages'] for result in results),
+        layers=layers,
+        seconds=seconds,
+        filesPerSecond=len(results) / seconds if seconds else 0,
+        layersPerSecond=layers / seconds if seconds else 0,
+        phases=phases, # Total seconds in the workers, per phase.
+        errors={result['path']: result['error'] for result in results if not result['ok']},
+        results=results,
+    )
+
+def report(summary, f=sys.stdout):
+    """Write the readable summary to @f."""
+    f.write('%d files (%d failed), %d pages, %d layers in %0.2fs\n' % (summary['files'],
+        summary['failed'], summary['pages'], summary['layers'], summary['seconds']))
+    f.write('%0.2f files/s, %0.0f layers/s\n' % (summary['filesPerSecond'], summary['layersPerSecond']))
+    total = sum(summary['phases'].values()) or 1
+    for phase, seconds in summary['phases'].items():
+        f.write('    %-8s %8.2fs %5.1f%%\n' % (phase, seconds, 100 * seconds / total))
+    for path, error in summary['errors'].items():
+        f.write('FAILED %s: %s\n' % (path, error))
+
+def _errorResult(path, e):
+    return dict(path=path, ok=False, error='%s: %s' % (e.__class__.__name__, e),
+        pages=0, layers=0, phases={phase: 0 for phase in PHASES}, seconds=0)
+
+def _convertInPool(paths, processes, args, results, progress):
+    """Convert @paths in a new pool of @processes workers, storing the
+    results. Answer the list of paths that did not get a result because a
+    worker died (e.g. crashed or killed for memory), which breaks the pool.
+    """
+    broken = []
+    with ProcessPoolExecutor(processes, initializer=warmUp) as executor:
+        futures = {executor.submit(convertFile, path, *args): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                broken.append(path)
+                continue
+            except Exception as e: # E.g. the result could not be pickled.
+                result = _errorResult(path, e)
+            results[path] = result
+            if progress is not None:
+                progress(result)
+    return [path for path in paths if path in broken]
+
+def convertFiles(paths, processes=None, outputDir=None, extension=None, lazy=False, stream=False,
+        progress=None):
+    """Convert the .sketch files @paths in a pool of @processes workers.
+    Answer the summary dictionary (see summarize). Optional @progress is
+    called with every result, in order of completion. If a worker dies, the
+    files that were still pending run again in a new pool, and if that
+    breaks too, each in its own process, so only the file that kills its
+    worker fails.
+    """
+    if outputDir is not None and not os.path.exists(outputDir):
+        os.makedirs(outputDir)
+    start = time.perf_counter()
+    args = (outputDir, extension, lazy, stream)
+    results = {}
+    broken = _convertInPool(paths, processes, args, results, progress)
+    if broken:
+        broken = _convertInPool(broken, processes, args, results, progress)
+    for path in broken:
+        if _convertInPool([path], 1, args, results, progress):
+            results[path] = result = _errorResult(path, BrokenProcessPool('worker process died'))
+            if progress is not None:
+                progress(result)
+    # Answer the results in the order of the paths.
+    return summarize([results[path] for path in paths], time.perf_counter() - start)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='pagebotsketch-convert',
+        description='Convert .sketch files into PageBot documents.')
+    parser.add_argument('inputs', nargs='+', help='.sketch files, directories or glob patterns')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+        help='number of worker processes, default the number of CPUs')
+    parser.add_argument('-o', '--output', default=None, help='directory of the exported documents')
+    parser.add_argument('-e', '--extension', default=None, help='export file extension, e.g. .pdf or .png')
+    parser.add_argument('--lazy', action='store_true', help='decode the pages only when needed')
+    parser.add_argument('--stream', action='store_true', help='stream the artboards (implies --lazy)')
+    parser.add_argument('--json', default=None, help='write the summary as JSON to this path, - for stdout')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report the progress')
+    options = parser.parse_args(args)
+
+    paths = collectFiles(options.inputs)
+    if not paths:
+        parser.error('no .sketch files found')
+    if options.output is not None and options.extension is None:
+        options.extension = '.pdf'
+    if options.extension is not None and not options.extension.startswith('.'):
+        options.extension = '.' + options.extension
+
+    def progress(result):
+        if not options.quiet:
+            sys.stderr.write('%s %s %0.2fs\n' % ('ok    ' if result['ok'] else 'FAILED',
+                result['path'], result['seconds']))
+
+    summary = convertFiles(paths, options.processes, options.output, options.extension,
+        options.lazy or options.stream, options.stream, progress)
+    report(summary, sys.stderr if options.json == '-' else sys.stdout)
+    if options.json == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    elif options.json is not None:
+        with open(options.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,32 +13,137 @@
 #
 #     sketchbuilder.py
 #
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
 from pagebot.contexts.basecontext.basebuilder import BaseBuilder
 from pagebot.toolbox.units import upt
 from pysketch.sketchapi import SketchApi
+from pysketch.sketchclasses import SketchPage
+
+from pagebotsketch.sketchimages import probeImages
+from pagebotsketch.sketchlazypage import SketchLazyPage, newLayer, loadPage, loadLayers
+from pagebotsketch.sketchspatial import SketchGridIndex
+from pagebotsketch.sketchstats import newStats
+from pagebotsketch.sketchzip import (DOCUMENT_JSON, META_JSON, USER_JSON, PAGES_JSON,
+    pageMembers, iterPageLayers, pageLayerTexts, splitTexts, encodeJson, rewriteArchive)
 
 class SketchBuilder(BaseBuilder):
     PB_ID = 'Sketch'
 
-    def __init__(self, path=None, **kwargs):
-    	"""
+    def __init__(self, path=None, lazy=False, cache=None, stats=None, **kwargs):
+        """
         >>> import pysketch
         >>> from pagebot.toolbox.transformer import path2Dir
         >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
-		>>> b = SketchBuilder(path)
+        >>> b = SketchBuilder(path)
         >>> b
         <SketchBuilder path=TemplateSquare.sketch>
-		>>> b.api
-		<SketchApi path=TemplateSquare.sketch>
-		>>> sketchPage = b.api.selectPage(0)
-		>>> sketchPage, sketchPage.frame
-		(<SketchPage name=Page 1>, <SketchRect x=0 y=0 w=0 h=0>)
-    	"""
-    	super().__init__(**kwargs)
-    	self.api = SketchApi(path)
+        >>> b.api
+        <SketchApi path=TemplateSquare.sketch>
+        >>> sketchPage = b.api.selectPage(0)
+        >>> sketchPage, sketchPage.frame
+        (<SketchPage name=Page 1>, <SketchRect x=0 y=0 w=0 h=0>)
+
+        If @lazy is True, the file is not parsed on construction. Then
+        self.pages answers SketchLazyPage proxies, that only decode their
+        page member on first access of their layers. Other access to
+        self.api parses the whole file as before.
+
+        >>> b = SketchBuilder(path, lazy=True)
+        >>> b.isLoaded
+        False
+        >>> page = b.pages[0]
+        >>> page, page.isLoaded
+        (<SketchLazyPage name=Page 1 loaded=False>, False)
+        >>> len(page.layers), page.isLoaded
+        (1, True)
+        >>> b.isLoaded # Still no full parse of the file
+        False
+
+        Optional @cache is a SketchCache instance. Then the parsed SketchApi
+        is read from the cache if the same file content was parsed before.
+
+        >>> import tempfile
+        >>> from pagebotsketch.sketchcache import SketchCache
+        >>> cache = SketchCache(tempfile.mkdtemp())
+        >>> b = SketchBuilder(path, cache=cache)
+        >>> b = SketchBuilder(path, cache=cache)
+        >>> b.api
+        <SketchApi path=TemplateSquare.sketch>
+        >>> cache.hits, cache.misses
+        (1, 1)
+
+        Optional @stats is True or a SketchStats instance, that records the
+        time of the phases of reading and saving (see sketchstats). By
+        default nothing is recorded.
+
+        >>> b = SketchBuilder(path, lazy=True, stats=True)
+        >>> len(b.pages[0].layers)
+        1
+        >>> sorted(b.stats.asDict())
+        ['construct', 'decode', 'unzip']
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self.lazy = lazy and path is not None
+        self.cache = cache
+        self.stats = newStats(stats)
+        self._api = None
+        self._lazyPages = None # Cached list of SketchLazyPage, in lazy mode.
+        self._spatialIndexes = {} # Cached {artboardId: SketchGridIndex}
+        self._idLayers = None # Index {sId: layer}, built on first use.
+        self._idParents = None # Index {sId: parentLayer}
+        self._idPages = None # Index {sId: page}
+        self._idIndexBuildTime = None
+        self.generation = 0 # Incremented by every change, invalidating self._memo
+        self._memo = {} # Memoized answers {key: (generation, value)}
+        self.memoHits = self.memoMisses = 0
+        self._imageInfos = {} # Probed {imageRef: SketchImageInfo}
+        self._zipInfos = None # {member: ZipInfo} of the file, read on first use.
+        self._dirty = set() # Names of changed JSON members, since the last save.
+        self._allDirty = False # All JSON members changed, e.g. after self.touch()
+        if not self.lazy:
+            self._api = self._newApi()
+
+    def _newApi(self):
+        """Answer a new SketchApi for self.path, from self.cache if defined."""
+        with self.stats.phase('parse', items=1):
+            return self._loadApi()
+
+    def _loadApi(self):
+        if self.cache is None or self.path is None:
+            return SketchApi(self.path)
+        api = self.cache.load(self.path, SketchApi)
+        # The cached model may have been parsed from a copy at another path.
+        if getattr(api, 'filePath', self.path) != self.path:
+            api.filePath = self.path
+            api.sketchFile.path = self.path
+        return api
+
+    def _get_api(self):
+        """Answer the SketchApi instance. In lazy mode the file is parsed on
+        first access.
+        """
+        if self._api is None:
+            self._api = self._newApi()
+        return self._api
+    api = property(_get_api)
+
+    def _get_isLoaded(self):
+        """Answer the boolean flag if the SketchApi parsed the whole file."""
+        return self._api is not None
+    isLoaded = property(_get_isLoaded)
 
     def __repr__(self):
-        return '<%s path=%s>' % (self.__class__.__name__, self.api.sketchFile.path.split('/')[-1])
+        if self._api is None:
+            path = self.path
+        else:
+            path = self._api.sketchFile.path
+        return '<%s path=%s>' % (self.__class__.__name__, path.split('/')[-1])
 
     def frameDuration(self, frameDuration):
         pass
@@ -49,6 +154,213 @@ class SketchBuilder(BaseBuilder):
     def fill(self, e, g, b, alpha=None):
         pass
 
+    def _memoize(self, key, f):
+        """Answer the memoized value of f() for @key, if it was calculated in
+        the current generation. Otherwise call f() and memoize the result.
+        """
+        entry = self._memo.get(key)
+        if entry is not None and entry[0] == self.generation:
+            self.memoHits += 1
+            return entry[1]
+        self.memoMisses += 1
+        value = f()
+        self._memo[key] = self.generation, value
+        return value
+
+    def touch(self, layer=None):
+        """Mark the Sketch data as changed. Mutating methods of the builder
+        do this automatically. Call this method after changing the pages or
+        layers directly through self.api or the Sketch objects, so memoized
+        answers and the id and spatial indexes are rebuilt. If the changed
+        @layer (or page) is defined, only its page is marked dirty for
+        self.saveIncremental, otherwise all pages are.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> b.pages is b.pages # Memoized answer
+        True
+        >>> b.memoStats['hits'], b.memoStats['misses']
+        (1, 1)
+        >>> b.touch()
+        >>> _ = b.pages
+        >>> b.memoStats
+        {'hits': 1, 'misses': 2, 'generation': 1}
+        """
+        page = None
+        if layer is not None:
+            page = self._indexedPage(layer) # Before the index is cleared.
+        self._changed()
+        self._idLayers = self._idParents = self._idPages = None
+        self._spatialIndexes = {}
+        if page is not None:
+            self._dirty.add(self._pageMember(page))
+        else: # Unknown page, build the index again to find it, or mark all.
+            self.markDirty(layer)
+
+    def _indexedPage(self, layer):
+        """Answer the page of @layer without building the id index. The
+        parents of @layer are followed up to the page, as they may have
+        changed since the index was built. Otherwise the first parent that
+        is in the current index answers the page. Answer None if not found.
+        """
+        pages = self.pages
+        parents = []
+        while layer is not None:
+            if any(page is layer for page in pages):
+                return layer
+            parents.append(layer)
+            layer = getattr(layer, 'parent', None)
+        idPages = self._idPages or {}
+        for parent in parents:
+            page = idPages.get(parent.do_objectID)
+            if page is not None:
+                return page
+        return None
+
+    def markDirty(self, layer=None, member=None):
+        """Mark the page member that contains @layer as changed, or the
+        document @member by name (e.g. META_JSON). Without arguments all
+        JSON members are marked. Only dirty members are encoded again by
+        self.saveIncremental. If the page of @layer cannot be found, e.g.
+        because it was added directly to a layer that is not in the id
+        index, all members are marked, so the change is never lost.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> b.dirtyMembers
+        set()
+        >>> page = b.pages[0]
+        >>> b.markDirty(page.layers[0])
+        >>> b.dirtyMembers == {'pages/%s.json' % page.do_objectID}
+        True
+        """
+        if member is not None:
+            self._dirty.add(member)
+        elif layer is None:
+            self._allDirty = True
+        elif any(page is layer for page in self.pages):
+            self._dirty.add(self._pageMember(layer))
+        else:
+            page = self.findPage(layer.do_objectID)
+            if page is None:
+                self._allDirty = True
+            else:
+                self._dirty.add(self._pageMember(page))
+
+    def markLoadedDirty(self):
+        """In lazy mode, mark the page members of all loaded pages as changed,
+        as their layers may have been edited without self.touch. Pages that
+        were never loaded are copied raw by self.saveIncremental.
+        """
+        for page in self.pages:
+            if not isinstance(page, SketchLazyPage) or page.isLoaded:
+                self._dirty.add(self._pageMember(page))
+
+    def clearDirty(self):
+        self._dirty = set()
+        self._allDirty = False
+
+    def _pageMember(self, page):
+        return '%s%s.json' % (PAGES_JSON, page.do_objectID)
+
+    def _get_dirtyMembers(self):
+        """Answer the set of names of the JSON members that changed since
+        the last save.
+        """
+        if self._allDirty:
+            return {self._pageMember(page) for page in self.pages} | {DOCUMENT_JSON, META_JSON, USER_JSON}
+        return set(self._dirty)
+    dirtyMembers = property(_get_dirtyMembers)
+
+    def _encodeMember(self, member):
+        """Answer the JSON encoded data of the dirty @member. Page members are
+        answered by their SketchPage, the other ones (document, meta, user) by
+        the attribute of self.api.sketchFile with the same name.
+        """
+        if member.startswith(PAGES_JSON):
+            pageId = member[len(PAGES_JSON):-len('.json')]
+            for page in self.pages:
+                if page.do_objectID == pageId:
+                    return encodeJson(page.asDict())
+            return None # Page was removed.
+        return encodeJson(getattr(self.api.sketchFile, member[:-len('.json')]).asDict())
+
+    def saveIncremental(self, path=None, profile=None, threads=None):
+        """Save the Sketch data to @path, or to the file it was read from. Only
+        the dirty JSON members are encoded and compressed again. All other
+        members, like the images and previews, are copied raw from the
+        original file, unless the save @profile ('fast', 'balanced' or
+        'smallest', see sketchzip.SAVE_PROFILES) needs another compression
+        for them. Members are compressed in a pool of @threads. Answer the
+        SketchZipWriter with the statistics.
+
+        >>> import os, shutil, tempfile
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = os.path.join(tempfile.mkdtemp(), 'TemplateSquare.sketch')
+        >>> _ = shutil.copy(path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch', path)
+        >>> b = SketchBuilder(path)
+        >>> page = b.pages[0]
+        >>> page.layers[0].name = 'Changed'
+        >>> b.touch(page)
+        >>> writer = b.saveIncremental()
+        >>> len(writer.entries) > 1, b.dirtyMembers
+        (True, set())
+        >>> SketchBuilder(path).pages[0].layers[0].name
+        'Changed'
+        """
+        srcPath = self.filePath
+        if path is None:
+            path = srcPath
+        members = {}
+        dirtyMembers = self.dirtyMembers
+        with self.stats.phase('encode', items=len(dirtyMembers)):
+            for member in dirtyMembers:
+                members[member] = self._encodeMember(member)
+        # Add the new pages and leave out the removed ones. As the list of pages
+        # in document.json and meta.json changes, these are encoded too.
+        pageIds = {page.do_objectID for page in self.pages}
+        srcPageIds = set()
+        for member, pageId, _ in pageMembers(srcPath):
+            srcPageIds.add(pageId)
+            if pageId not in pageIds:
+                members[member] = None
+        for page in self.pages:
+            if page.do_objectID not in srcPageIds:
+                members[self._pageMember(page)] = encodeJson(page.asDict())
+        if pageIds != srcPageIds:
+            for member in (DOCUMENT_JSON, META_JSON):
+                members[member] = self._encodeMember(member)
+        with self.stats.phase('zip', items=len(members)):
+            writer = rewriteArchive(srcPath, path, members, profile=profile, threads=threads)
+        if os.path.abspath(path) == os.path.abspath(srcPath):
+            self.clearDirty() # Otherwise the source is still the original.
+            self._zipInfos = None
+        return writer
+
+    def _changed(self):
+        """Increment the generation, invalidating all memoized answers."""
+        self.generation += 1
+
+    def _get_memoStats(self):
+        """Answer the dictionary with the hits and misses of memoized answers
+        and the current generation.
+        """
+        return dict(hits=self.memoHits, misses=self.memoMisses, generation=self.generation)
+    memoStats = property(_get_memoStats)
+
+    def selectPage(self, index):
+        """Select the current page by @index, answering the SketchPage. This
+        changes the answer of self.artboards.
+        """
+        page = self.api.selectPage(index)
+        self._changed()
+        return page
+
     def _get_pages(self):
         """Answer the list of all SketchPage instances.
 
@@ -58,12 +370,191 @@ class SketchBuilder(BaseBuilder):
         >>> b = SketchBuilder(path)
         >>> b.pages
         [<SketchPage name=Page 1>]
+        >>> SketchBuilder(path, lazy=True).pages
+        [<SketchLazyPage name=Page 1 loaded=False>]
         """
-        return self.api.getPages()
+        if self.lazy:
+            if self._lazyPages is None:
+                self._lazyPages = []
+                for member, pageId, name in pageMembers(self.path):
+                    self._lazyPages.append(SketchLazyPage(self.path, member, pageId, name,
+                        stats=self.stats))
+            return self._lazyPages
+        return self._memoize('pages', self.api.getPages)
     pages = property(_get_pages)
 
+    def iterArtboards(self, page):
+        """Generator answering the top-level layers (artboards, symbol masters)
+        of the @page one by one. If @page is a SketchLazyPage that is not
+        loaded, the layers are streamed from the page member in the file, so
+        only one artboard at a time is decoded and kept in memory.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path, lazy=True)
+        >>> page = b.pages[0]
+        >>> list(b.iterArtboards(page))
+        [<SketchArtboard name=Artboard 1 w=576 h=783>]
+        >>> page.isLoaded # Artboards were streamed, not loading the page.
+        False
+        """
+        if isinstance(page, SketchLazyPage) and not page.isLoaded:
+            with zipfile.ZipFile(page.path, mode='r') as zf:
+                for d in iterPageLayers(zf, page.member):
+                    yield newLayer(d)
+        else:
+            yield from page.layers
+
+    def loadPages(self, processes=None, artboardChunks=1):
+        """In lazy mode, decode all pages that are not loaded yet in a pool
+        of @processes processes (default the number of cores), keeping the
+        original page order. If @artboardChunks is larger than 1, the top-level
+        layers of each page are divided over that number of tasks, so a single
+        large page also uses multiple cores. Then this process only scans the
+        page for the ends of its top-level layers (see
+        sketchzip.pageLayerTexts), and each task decodes its own part of the
+        JSON text. See Benchmarks/chunkedload.py.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path, lazy=True)
+        >>> b.loadPages(processes=2, artboardChunks=2)
+        >>> b.pages[0].isLoaded, b.pages[0].layers
+        (True, [<SketchArtboard name=Artboard 1 w=576 h=783>])
+        >>> b.pages[0].layers[0].parent is b.pages[0].page
+        True
+        """
+        if not self.lazy:
+            return # All pages are already parsed.
+        pages = [page for page in self.pages if not page.isLoaded]
+        if not pages:
+            return
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            if artboardChunks <= 1:
+                futures = [pool.submit(loadPage, page.path, page.member) for page in pages]
+                for page, future in zip(pages, futures):
+                    page.setPage(future.result())
+            else:
+                futures = []
+                for page in pages:
+                    header, texts = pageLayerTexts(page.path, page.member)
+                    futures.append((header, [pool.submit(loadLayers, chunk)
+                        for chunk in splitTexts(texts, artboardChunks)]))
+                for page, (header, pageFutures) in zip(pages, futures):
+                    layers = []
+                    for future in pageFutures:
+                        layers += future.result()
+                    sketchPage = SketchPage(dict(header, layers=[]))
+                    for layer in layers:
+                        layer.parent = sketchPage # Instead of the temporary page of loadLayers.
+                    sketchPage.layers = layers
+                    page.setPage(sketchPage)
+
+    def iterLayers(self, root, order='pre', filter=None, includeRoot=False):
+        """Generator answering (layer, depth, parent) for all layers in the
+        tree of @root, using an explicit stack instead of recursion, so there
+        is no limit to the nesting depth. The children of root have depth 1.
+        With @order 'pre' a layer is answered before its children, with
+        'post' after them. Optional @filter is a function answering False for
+        a layer, to skip that layer and all its children.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> artboard = b.artboards[0]
+        >>> layer, depth, parent = next(b.iterLayers(artboard, includeRoot=True))
+        >>> layer, depth, parent
+        (<SketchArtboard name=Artboard 1 w=576 h=783>, 0, None)
+        >>> from pysketch.sketchclasses import SketchGroup
+        >>> root = group = SketchGroup()
+        >>> for n in range(5000): # Nesting far deeper than the recursion limit
+        ...     child = SketchGroup()
+        ...     group.layers = [child]
+        ...     group = child
+        >>> len(list(b.iterLayers(root, order='post')))
+        5000
+        """
+        if includeRoot:
+            stack = [(root, 0, None, False)]
+        else:
+            stack = [(child, 1, root, False) for child in reversed(getattr(root, 'layers', None) or [])]
+        post = order == 'post'
+        while stack:
+            layer, depth, parent, expanded = stack.pop()
+            if expanded: # Post order, all children have been answered.
+                yield layer, depth, parent
+                continue
+            if filter is not None and not filter(layer):
+                continue
+            if post:
+                stack.append((layer, depth, parent, True))
+            else:
+                yield layer, depth, parent
+            children = getattr(layer, 'layers', None)
+            if children:
+                for child in reversed(children):
+                    stack.append((child, depth+1, layer, False))
+
+    def getSpatialIndex(self, artboard):
+        """Answer the SketchGridIndex over the absolute bounds of all layers
+        in @artboard, relative to the artboard origin. The index is built on
+        first use and kept until self.invalidateSpatialIndex is called.
+        """
+        artboardId = artboard.do_objectID
+        index = self._spatialIndexes.get(artboardId)
+        if index is None:
+            origins = {id(artboard): (0, 0)} # Absolute origin of each group.
+            items = []
+            for layer, _, parent in self.iterLayers(artboard):
+                px, py = origins[id(parent)]
+                frame = layer.frame
+                x, y = px + frame.x, py + frame.y
+                items.append((x, y, frame.w, frame.h, layer))
+                if getattr(layer, 'layers', None):
+                    origins[id(layer)] = x, y
+            index = self._spatialIndexes[artboardId] = SketchGridIndex(items)
+        return index
+
+    def invalidateSpatialIndex(self, artboard=None):
+        """Remove the spatial index of @artboard, or all of them if None, to
+        be built again after the layers changed.
+        """
+        if artboard is None:
+            self._spatialIndexes = {}
+        else:
+            self._spatialIndexes.pop(artboard.do_objectID, None)
+
+    def layersInRect(self, artboard, x, y, w, h):
+        """Answer the list of layers in @artboard that overlap the rectangle
+        (x, y, w, h), in Sketch coordinates relative to the artboard, in
+        drawing order.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> artboard = b.artboards[0]
+        >>> len(b.layersInRect(artboard, 0, 0, artboard.frame.w, artboard.frame.h)) > 0
+        True
+        >>> b.layersInRect(artboard, -1000, -1000, 10, 10)
+        []
+        """
+        return self.getSpatialIndex(artboard).query(x, y, w, h)
+
+    def layerAt(self, artboard, x, y):
+        """Answer the top-most layer in @artboard that contains the point
+        (x, y), or None. A group is answered only if none of its children
+        contains the point.
+        """
+        return self.getSpatialIndex(artboard).hit(x, y)
+
     def _get_artboards(self):
-        """Answer a list with all artboards on the current selected page.
+        """Answer a list with all artboards on the current selected page. The
+        answer is not memoized, as callers select pages directly through
+        self.api.selectPage, without changing the generation.
 
         >>> import pysketch
         >>> from pagebot.toolbox.transformer import path2Dir
@@ -76,14 +567,239 @@ class SketchBuilder(BaseBuilder):
     artboards = property(_get_artboards)
 
     def _get_idLayers(self):
-        """Answer the dictionary with {layer.do_objectID: layer, ...}
+        """Answer the dictionary with {layer.do_objectID: layer, ...} of all
+        pages and layers. The dictionary is the index that is built on first
+        use and then kept up to date by self.addLayer, self.removeLayer and
+        self.moveLayer. It should not be altered by the caller.
 
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> artboard = b.artboards[0]
+        >>> b.idLayers[artboard.do_objectID] is artboard
+        True
         """
-        return self.api.getIdLayers()
+        if self._idLayers is None:
+            self.buildIdIndex()
+        return self._idLayers
     idLayers = property(_get_idLayers)
 
+    def buildIdIndex(self):
+        """Build the index of all pages and layers by their do_objectID, with
+        the parent and the page of every layer. The build time and size are
+        stored for self.idIndexStats.
+        """
+        t = time.time()
+        self._idLayers = idLayers = {}
+        self._idParents = {}
+        self._idPages = {}
+        for page in self.pages:
+            idLayers[page.do_objectID] = page
+            self._indexLayers(page, page)
+        self._idIndexBuildTime = time.time() - t
+
+    def _indexLayers(self, root, page):
+        """Add the descendants of @root on @page to the id index."""
+        idLayers = self._idLayers
+        idParents = self._idParents
+        idPages = self._idPages
+        for layer, _, parent in self.iterLayers(root):
+            sId = layer.do_objectID
+            idLayers[sId] = layer
+            idParents[sId] = parent
+            idPages[sId] = page
+
+    def _unindexLayers(self, root):
+        """Remove @root and its descendants from the id index."""
+        for layer, _, _ in self.iterLayers(root, includeRoot=True):
+            sId = layer.do_objectID
+            self._idLayers.pop(sId, None)
+            self._idParents.pop(sId, None)
+            self._idPages.pop(sId, None)
+
+    def _get_idIndexStats(self):
+        """Answer a dictionary with the number of indexed layers, the build
+        time in seconds and the approximate size in bytes of the id index.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> stats = b.idIndexStats
+        >>> stats['layers'] > 0, stats['size'] > 0
+        (True, True)
+        """
+        if self._idLayers is None:
+            self.buildIdIndex()
+        size = sum(sys.getsizeof(d) for d in (self._idLayers, self._idParents, self._idPages))
+        return dict(layers=len(self._idLayers), buildTime=self._idIndexBuildTime, size=size)
+    idIndexStats = property(_get_idIndexStats)
+
+    def findBysId(self, sId):
+        """Answer the page or layer with do_objectID @sId, or None if it does
+        not exist.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> artboard = b.artboards[0]
+        >>> b.findBysId(artboard.do_objectID) is artboard, b.findBysId('Unknown ID')
+        (True, None)
+        """
+        return self.idLayers.get(sId)
+
+    def findParent(self, sId):
+        """Answer the parent layer (or page) of the layer with @sId."""
+        if self._idLayers is None:
+            self.buildIdIndex()
+        return self._idParents.get(sId)
+
+    def findPage(self, sId):
+        """Answer the page that contains the layer with @sId."""
+        if self._idLayers is None:
+            self.buildIdIndex()
+        return self._idPages.get(sId)
+
+    def _findArtboard(self, layer):
+        """Answer the top-level layer of the page that contains @layer."""
+        sId = layer.do_objectID
+        page = self.findPage(sId)
+        while True:
+            parent = self._idParents.get(sId)
+            if parent is None or parent is page:
+                return self._idLayers.get(sId)
+            sId = parent.do_objectID
+
+    def addLayer(self, parent, layer, index=None):
+        """Add @layer to the layers of @parent, at @index or at the end if None,
+        and add it with its descendants to the id index.
+
+        >>> import pysketch
+        >>> from pysketch.sketchclasses import SketchGroup
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path)
+        >>> artboard = b.artboards[0]
+        >>> group = SketchGroup()
+        >>> b.addLayer(artboard, group)
+        >>> b.findParent(group.do_objectID) is artboard
+        True
+        >>> b.removeLayer(group)
+        >>> b.findBysId(group.do_objectID) is None
+        True
+        """
+        if index is None:
+            parent.layers.append(layer)
+        else:
+            parent.layers.insert(index, layer)
+        self.markDirty(parent)
+        if self._idLayers is not None:
+            sId = layer.do_objectID
+            page = self._idPages.get(parent.do_objectID, parent)
+            self._idLayers[sId] = layer
+            self._idParents[sId] = parent
+            self._idPages[sId] = page
+            self._indexLayers(layer, page)
+            self.invalidateSpatialIndex(self._findArtboard(layer))
+        else:
+            self.invalidateSpatialIndex()
+        self._changed()
+
+    def removeLayer(self, layer):
+        """Remove @layer from its parent and remove it with its descendants
+        from the id index.
+        """
+        if self._idLayers is None:
+            self.buildIdIndex()
+        self.markDirty(layer)
+        artboard = self._findArtboard(layer)
+        parent = self._idParents.get(layer.do_objectID)
+        if parent is not None:
+            parent.layers.remove(layer)
+        self._unindexLayers(layer)
+        if artboard is not None:
+            self.invalidateSpatialIndex(artboard)
+        self._changed()
+
+    def moveLayer(self, layer, parent, index=None):
+        """Move @layer to the layers of @parent, at @index or at the end."""
+        self.removeLayer(layer)
+        self.addLayer(parent, layer, index)
+
+    def _get_filePath(self):
+        """Answer the path of the .sketch file, without parsing it."""
+        return self.path or self.api.filePath
+    filePath = property(_get_filePath)
+
+    def _get_zipInfos(self):
+        """Answer the dictionary {member: ZipInfo} of the .sketch file, read
+        once from its zip directory. It is read again after the file is
+        rewritten by self.saveIncremental.
+        """
+        if self._zipInfos is None:
+            with zipfile.ZipFile(self.filePath, mode='r') as zf:
+                self._zipInfos = dict(zf.NameToInfo)
+        return self._zipInfos
+    zipInfos = property(_get_zipInfos)
+
+    def _imageRef(self, layer):
+        ref = getattr(getattr(layer, 'image', None), '_ref', None)
+        if ref is not None and '.' not in ref.split('/')[-1]:
+            ref += '.png' # Older files refer to images without extension.
+        return ref
+
+    def imageInfo(self, layer):
+        """Answer the SketchImageInfo (format, w, h, colorType, bitDepth, dpi)
+        of the SketchBitmap @layer, only reading the header of the image
+        member in the .sketch file. Answer None if @layer has no image or the
+        image is no PNG or JPEG. The results are cached by image reference,
+        which is the hash of the image content, so they never get invalid.
+        """
+        ref = self._imageRef(layer)
+        if ref is None:
+            return None
+        if ref not in self._imageInfos:
+            self._imageInfos.update(probeImages(self.filePath, [ref]))
+        return self._imageInfos[ref]
+
+    def imageInfos(self, root=None):
+        """Answer the dictionary {sId: SketchImageInfo} for all SketchBitmap
+        layers in @root, or in all pages if @root is None. The images that are
+        not cached yet are probed opening the archive only once.
+        """
+        roots = self.pages if root is None else [root]
+        bitmaps = []
+        for root in roots:
+            for layer, _, _ in self.iterLayers(root):
+                if self._imageRef(layer) is not None:
+                    bitmaps.append(layer)
+        refs = {self._imageRef(layer) for layer in bitmaps} - set(self._imageInfos)
+        if refs:
+            self._imageInfos.update(probeImages(self.filePath, sorted(refs)))
+        return {layer.do_objectID: self._imageInfos[self._imageRef(layer)] for layer in bitmaps}
+
     def _get_size(self):
-        return upt(self.api.getSize())
+        """Answer the size of the document. In lazy mode, when the file is not
+        parsed yet, answer the size of the first artboard of the first page,
+        only streaming that artboard, so the page is not loaded.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> b = SketchBuilder(path, lazy=True)
+        >>> w, h = b.size
+        >>> b.pages[0].isLoaded
+        False
+        """
+        if self.lazy and self._api is None:
+            for page in self.pages:
+                artboards = self.iterArtboards(page)
+                for artboard in artboards:
+                    artboards.close() # Closes the zip archive of a streamed page.
+                    return upt(artboard.frame.w, artboard.frame.h)
+        return self._memoize('size', lambda: upt(self.api.getSize()))
     size = property(_get_size)
 
     def restore(self):
@@ -0,0 +1,194 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchcache.py
+#
+#     Persistent cache of parsed Sketch files. The parsed model (e.g. the
+#     SketchApi instance) is stored as compressed pickle, keyed by the SHA-1
+#     hash of the .sketch file content, so opening the same file again skips
+#     the unzip, JSON decode and object construction.
+#
+import hashlib
+import os
+import pickle
+import time
+import zlib
+
+CACHE_VERSION = 1 # Increment if the layout of the cached models changes.
+CACHE_EXTENSION = '.pickle'
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'pagebotsketch')
+DEFAULT_MAX_SIZE = 512*1024*1024 # Total size of the cache directory in bytes.
+HASH_BLOCK = 1024*1024
+
+class SketchCache:
+    """Directory with compressed pickles of parsed .sketch files. If the total
+    size exceeds @maxSize, the least recently used entries are removed. The
+    modification time of the cache files is used to record their use.
+
+    >>> import tempfile
+    >>> cacheDir = tempfile.mkdtemp()
+    >>> sketchPath = os.path.join(cacheDir, 'Test.sketch')
+    >>> with open(sketchPath, 'wb') as f:
+    ...     _ = f.write(b'Sketch file data')
+    >>> cache = SketchCache(cacheDir)
+    >>> cache.load(sketchPath, lambda path: dict(parsed=True))
+    {'parsed': True}
+    >>> cache.load(sketchPath, lambda path: dict(parsed=True)) # Not parsed again.
+    {'parsed': True}
+    >>> cache.hits, cache.misses, cache.stores, len(cache)
+    (1, 1, 1, 1)
+    >>> cache.clear()
+    >>> len(cache)
+    0
+    """
+    def __init__(self, path=None, maxSize=DEFAULT_MAX_SIZE, level=1):
+        if path is None:
+            path = DEFAULT_CACHE_DIR
+        self.path = os.path.expanduser(path)
+        self.maxSize = maxSize
+        self.level = level # zlib compression level of the pickles.
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        # Known hashes {filePath: (mtime, size, hash)} to avoid hashing again.
+        self._hashes = {}
+        self.resetStats()
+
+    def __repr__(self):
+        return '<%s path=%s entries=%d>' % (self.__class__.__name__, self.path, len(self))
+
+    def __len__(self):
+        return len(self._entries())
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0 # Models that could not be pickled or unpickled.
+        self.evictions = 0
+        self.loadTime = 0 # Total seconds reading models from cache.
+        self.parseTime = 0 # Total seconds parsing models on a miss.
+
+    def _get_stats(self):
+        """Answer a dictionary with the statistics of the cache.
+
+        >>> import tempfile
+        >>> sorted(SketchCache(tempfile.mkdtemp()).stats.keys())
+        ['errors', 'evictions', 'hits', 'loadTime', 'misses', 'parseTime', 'stores']
+        """
+        return dict(hits=self.hits, misses=self.misses, stores=self.stores,
+            errors=self.errors, evictions=self.evictions, loadTime=self.loadTime,
+            parseTime=self.parseTime)
+    stats = property(_get_stats)
+
+    def report(self):
+        """Answer the statistics as readable string."""
+        return '%d hits, %d misses, %d stores, %d errors, %d evictions, load %0.3fs, parse %0.3fs' % (
+            self.hits, self.misses, self.stores, self.errors, self.evictions,
+            self.loadTime, self.parseTime)
+
+    def fileHash(self, path):
+        """Answer the SHA-1 hex digest of the file content. As long as mtime
+        and size of the file did not change, the previous hash is answered.
+        """
+        st = os.stat(path)
+        known = self._hashes.get(path)
+        if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+            return known[2]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        self._hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def entryPath(self, path):
+        """Answer the path of the cache entry for the .sketch file @path."""
+        return os.path.join(self.path, '%s-%d%s' % (self.fileHash(path), CACHE_VERSION, CACHE_EXTENSION))
+
+    def load(self, path, factory):
+        """Answer the parsed model of the .sketch file @path. If it is not in
+        the cache, then answer factory(path) and store the result.
+        """
+        entryPath = self.entryPath(path)
+        if os.path.exists(entryPath):
+            t = time.time()
+            try:
+                with open(entryPath, 'rb') as f:
+                    model = pickle.loads(zlib.decompress(f.read()))
+                os.utime(entryPath) # Mark as recently used.
+                self.hits += 1
+                self.loadTime += time.time() - t
+                return model
+            except (OSError, EOFError, zlib.error, pickle.UnpicklingError, AttributeError, ImportError):
+                self.errors += 1 # Corrupt or incompatible entry, parse again.
+        self.misses += 1
+        t = time.time()
+        model = factory(path)
+        self.parseTime += time.time() - t
+        self.store(entryPath, model)
+        return model
+
+    def store(self, entryPath, model):
+        """Store the model in the cache entry. Models that cannot be pickled
+        are counted in self.errors, but do not raise an error.
+        """
+        try:
+            data = zlib.compress(pickle.dumps(model, pickle.HIGHEST_PROTOCOL), self.level)
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            self.errors += 1
+            return
+        tmpPath = entryPath + '.tmp%d' % os.getpid()
+        with open(tmpPath, 'wb') as f:
+            f.write(data)
+        os.replace(tmpPath, entryPath) # Atomic for concurrent workers.
+        self.stores += 1
+        self.evict()
+
+    def _entries(self):
+        """Answer the list of (mtime, size, path) of all cache entries."""
+        entries = []
+        for fileName in os.listdir(self.path):
+            if fileName.endswith(CACHE_EXTENSION):
+                entryPath = os.path.join(self.path, fileName)
+                try:
+                    st = os.stat(entryPath)
+                except OSError: # Removed by another process.
+                    continue
+                entries.append((st.st_mtime, st.st_size, entryPath))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the total size of the
+        cache fits in self.maxSize.
+        """
+        entries = sorted(self._entries())
+        totalSize = sum(size for _, size, _ in entries)
+        while entries and totalSize > self.maxSize:
+            _, size, entryPath = entries.pop(0)
+            try:
+                os.remove(entryPath)
+            except OSError:
+                pass
+            totalSize -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, entryPath in self._entries():
+            os.remove(entryPath)
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
@@ -0,0 +1,286 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchcompare.py
+#
+#     Structural comparison of Sketch files and layer trees. Every layer gets
+#     a Merkle hash of its own properties and the hashes of its child layers,
+#     so identical subtrees are skipped by comparing one hash. Zip members
+#     with the same CRC are skipped without decoding them.
+#
+import hashlib
+import json
+import zipfile
+
+from pagebotsketch.sketchzip import readJson
+
+class SketchDifference:
+    """One difference between two Sketch files or layer trees. The @sId is
+    the do_objectID of the layer (or the member name for the root of a
+    member), the @path is the property path inside that layer, e.g.
+    'frame.x' or 'style.fills[0].color.red'. Values that are missing on one
+    side are answered as SketchDifference.MISSING.
+    """
+    MISSING = '<missing>'
+
+    def __init__(self, member, sId, path, value1, value2):
+        self.member = member # Name of the zip member, e.g. 'pages/<UUID>.json'
+        self.sId = sId
+        self.path = path
+        self.value1 = value1
+        self.value2 = value2
+
+    def __repr__(self):
+        return '<%s %s %s %s: %r != %r>' % (self.__class__.__name__, self.member,
+            self.sId, self.path, self.value1, self.value2)
+
+    def __eq__(self, other):
+        return isinstance(other, SketchDifference) and self.asTuple() == other.asTuple()
+
+    def asTuple(self):
+        return self.member, self.sId, self.path, self.value1, self.value2
+
+class SketchHashNode:
+    """Node of the hash tree of a layer dict. self.propsHash is the hash of
+    the properties of the layer itself, without its child layers. self.hash
+    is the Merkle hash, that also includes the hashes of all children.
+    """
+    def __init__(self, d, propsHash):
+        self.sId = d.get('do_objectID')
+        self.name = d.get('name')
+        self.props = {key: value for key, value in d.items() if key != 'layers'}
+        self.propsHash = propsHash
+        self.children = []
+        self.hash = None
+        self.count = 1 # Number of nodes in the tree, including self.
+
+    def __repr__(self):
+        return '<%s %s name=%s children=%d>' % (self.__class__.__name__, self.sId,
+            self.name, len(self.children))
+
+    def __len__(self):
+        return self.count
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+def hashTree(d):
+    """Answer the root SketchHashNode of the layer dict @d, with a node for
+    every dict in the nested 'layers' lists. The tree is built without
+    recursion, hashing the children before their parent.
+
+    >>> layer = dict(_class='group', do_objectID='G', layers=[dict(_class='rectangle', do_objectID='R')])
+    >>> node = hashTree(layer)
+    >>> node, node.children[0]
+    (<SketchHashNode G name=None children=1>, <SketchHashNode R name=None children=0>)
+    >>> hashTree(layer).hash == node.hash
+    True
+    >>> layer['layers'][0]['name'] = 'Changed'
+    >>> hashTree(layer).hash == node.hash, hashTree(layer).propsHash == node.propsHash
+    (False, True)
+    """
+    root = None
+    stack = [(d, None)]
+    order = [] # Nodes in pre-order, hashed in reverse to have the children first.
+    while stack:
+        layer, parent = stack.pop()
+        props = {key: value for key, value in layer.items() if key != 'layers'}
+        node = SketchHashNode(layer, _digest(json.dumps(props, sort_keys=True).encode('utf-8')))
+        if parent is None:
+            root = node
+        else:
+            parent.children.append(node)
+        order.append(node)
+        for child in reversed(layer.get('layers') or []):
+            stack.append((child, node))
+    for node in reversed(order):
+        node.hash = _digest(node.propsHash, *[child.hash for child in node.children])
+        node.count += sum(child.count for child in node.children)
+    return root
+
+class _FailFast(Exception):
+    pass
+
+class SketchComparator:
+    """Compare Sketch files, members or layer dicts by their hash trees. The
+    hash trees of members are cached by their CRC, so comparing many files
+    against the same original decodes it only once. If @failFast is True,
+    comparing stops at the first difference.
+
+    >>> page = dict(_class='page', do_objectID='P', layers=[
+    ...     dict(_class='artboard', do_objectID='A', frame=dict(x=0, y=0), layers=[
+    ...         dict(_class='text', do_objectID='T', name='Title')]),
+    ...     dict(_class='artboard', do_objectID='B', frame=dict(x=100, y=0))])
+    >>> changed = json.loads(json.dumps(page))
+    >>> changed['layers'][0]['layers'][0]['name'] = 'Other title'
+    >>> changed['layers'][1]['frame']['x'] = 200
+    >>> comparator = SketchComparator()
+    >>> comparator.compareLayers(page, changed)
+    [<SketchDifference None T name: 'Title' != 'Other title'>, <SketchDifference None B frame.x: 100 != 200>]
+    >>> SketchComparator(failFast=True).compareLayers(page, changed)
+    [<SketchDifference None T name: 'Title' != 'Other title'>]
+    >>> comparator.compareLayers(page, page)
+    []
+    """
+    def __init__(self, failFast=False):
+        self.failFast = failFast
+        self._trees = {} # Cached hash trees {(crc, size): SketchHashNode}
+        self.resetStats()
+
+    def resetStats(self):
+        self.skippedMembers = 0 # Members with equal CRC.
+        self.comparedMembers = 0
+        self.skippedNodes = 0 # Subtrees with equal hash.
+        self.comparedNodes = 0
+
+    def _get_stats(self):
+        return dict(skippedMembers=self.skippedMembers, comparedMembers=self.comparedMembers,
+            skippedNodes=self.skippedNodes, comparedNodes=self.comparedNodes)
+    stats = property(_get_stats)
+
+    def _add(self, differences, difference):
+        differences.append(difference)
+        if self.failFast:
+            raise _FailFast()
+
+    def compareFiles(self, path1, path2):
+        """Answer the list of SketchDifference instances between the .sketch
+        files @path1 and @path2. Members with the same CRC and size are not
+        decoded. Differences in binary members (images, previews) are
+        answered with their CRC values.
+        """
+        differences = []
+        with zipfile.ZipFile(path1) as zf1, zipfile.ZipFile(path2) as zf2:
+            try:
+                names = zf1.namelist() + [name for name in zf2.namelist() if name not in zf1.NameToInfo]
+                for name in names:
+                    info1 = zf1.NameToInfo.get(name)
+                    info2 = zf2.NameToInfo.get(name)
+                    if info1 is None or info2 is None:
+                        self._add(differences, SketchDifference(name, None, None,
+                            SketchDifference.MISSING if info1 is None else info1.CRC,
+                            SketchDifference.MISSING if info2 is None else info2.CRC))
+                    elif (info1.CRC, info1.file_size) == (info2.CRC, info2.file_size):
+                        self.skippedMembers += 1
+                    elif name.endswith('.json'):
+                        self.comparedMembers += 1
+                        self._compareNodes(name, self._memberTree(zf1, info1),
+                            self._memberTree(zf2, info2), differences)
+                    else:
+                        self.comparedMembers += 1
+                        self._add(differences, SketchDifference(name, None, None, info1.CRC, info2.CRC))
+            except _FailFast:
+                pass
+        return differences
+
+    def _memberTree(self, zf, info):
+        key = info.CRC, info.file_size
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = self._trees[key] = hashTree(readJson(zf, info.filename))
+        return tree
+
+    def compareLayers(self, d1, d2, member=None):
+        """Answer the list of SketchDifference instances between the layer
+        dicts @d1 and @d2. Sketch objects, such as pages and layers, are
+        compared by their asDict() answer.
+        """
+        if hasattr(d1, 'asDict'):
+            d1 = d1.asDict()
+        if hasattr(d2, 'asDict'):
+            d2 = d2.asDict()
+        differences = []
+        try:
+            self._compareNodes(member, hashTree(d1), hashTree(d2), differences)
+        except _FailFast:
+            pass
+        return differences
+
+    def _compareNodes(self, member, node1, node2, differences):
+        stack = [(node1, node2)]
+        while stack:
+            node1, node2 = stack.pop()
+            if node1.hash == node2.hash:
+                self.skippedNodes += node1.count
+                continue
+            self.comparedNodes += 1
+            sId = node1.sId or member
+            if node1.propsHash != node2.propsHash:
+                for path, value1, value2 in diffValues(node1.props, node2.props):
+                    self._add(differences, SketchDifference(member, sId, path, value1, value2))
+            children1 = [child.sId for child in node1.children]
+            children2 = [child.sId for child in node2.children]
+            if children1 != children2 and (None in children1 or None in children2 or
+                    len(set(children1)) != len(children1) or len(set(children2)) != len(children2)):
+                # Layers without unique ID's, match them by position.
+                self._add(differences, SketchDifference(member, sId, 'layers', children1, children2))
+                pairs = list(zip(node1.children, node2.children))
+            else:
+                if children1 != children2:
+                    self._add(differences, SketchDifference(member, sId, 'layers', children1, children2))
+                byId = {child.sId: child for child in node2.children}
+                pairs = [(child, byId[child.sId]) for child in node1.children if child.sId in byId]
+            for pair in reversed(pairs): # Reversed, to pop them in order.
+                stack.append(pair)
+
+def diffValues(value1, value2, path=''):
+    """Answer the list of (path, value1, value2) of the differences between
+    the JSON values @value1 and @value2.
+
+    >>> diffValues(dict(a=1, b=[1, 2], c=dict(d=3)), dict(a=1, b=[1, 3], c=dict(e=3)))
+    [('b[1]', 2, 3), ('c.d', 3, '<missing>'), ('c.e', '<missing>', 3)]
+    """
+    differences = []
+    stack = [(path, value1, value2)]
+    while stack:
+        path, value1, value2 = stack.pop()
+        if value1 == value2:
+            continue
+        if isinstance(value1, dict) and isinstance(value2, dict):
+            keys = list(value1) + [key for key in value2 if key not in value1]
+            for key in reversed(keys):
+                stack.append(('%s.%s' % (path, key) if path else key,
+                    value1.get(key, SketchDifference.MISSING), value2.get(key, SketchDifference.MISSING)))
+        elif isinstance(value1, list) and isinstance(value2, list) and len(value1) == len(value2):
+            for index in reversed(range(len(value1))):
+                stack.append(('%s[%d]' % (path, index), value1[index], value2[index]))
+        else:
+            differences.append((path, value1, value2))
+    return differences
+
+def compareSketchFiles(path1, path2, failFast=False):
+    """Answer the list of SketchDifference instances between the .sketch
+    files @path1 and @path2, or an empty list if they are equivalent.
+
+    >>> import os, tempfile
+    >>> tmpDir = tempfile.mkdtemp()
+    >>> page = dict(_class='page', do_objectID='P', layers=[dict(_class='artboard', do_objectID='A', name='A')])
+    >>> for fileName, name in (('1.sketch', 'A'), ('2.sketch', 'A'), ('3.sketch', 'B')):
+    ...     page['layers'][0]['name'] = name
+    ...     with zipfile.ZipFile(os.path.join(tmpDir, fileName), 'w') as zf:
+    ...         zf.writestr('pages/P.json', json.dumps(page, indent=(fileName == '2.sketch') or None))
+    >>> compareSketchFiles(os.path.join(tmpDir, '1.sketch'), os.path.join(tmpDir, '2.sketch'))
+    []
+    >>> compareSketchFiles(os.path.join(tmpDir, '1.sketch'), os.path.join(tmpDir, '3.sketch'))
+    [<SketchDifference pages/P.json A name: 'A' != 'B'>]
+    """
+    return SketchComparator(failFast).compareFiles(path1, path2)
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
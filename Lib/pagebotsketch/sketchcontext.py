@@ -32,6 +32,10 @@
 #  writing data into the designated file format.
 #
 import os
+import weakref
+import zipfile
+from copy import deepcopy
+from functools import lru_cache
 from random import random
 
 #from pagebot.document import Document
@@ -39,21 +43,115 @@ from random import random
 from pagebot.constants import FILETYPE_SKETCH, A4
 from pagebot.contexts.basecontext.basecontext import BaseContext
 from pagebot.contexts.basecontext.babelstring import BabelString
+from pagebot.contexts.basecontext.babelrun import BabelRun
 from pagebot.constants import *
-from pagebot.toolbox.color import color
+from pagebot.toolbox.color import color, Color
 from pagebot.toolbox.units import pt, units, upt
 
 from pagebotsketch.sketchbuilder import SketchBuilder
+from pagebotsketch.sketchcompare import hashTree
+from pagebotsketch.sketchimages import extractImages, extractMember, SketchImageSource
+from pagebotsketch.sketchlazypage import newLayer
+from pagebotsketch.sketchstats import newStats
+from pagebotsketch.sketchwatch import SketchWatcher, DEFAULT_INTERVAL, DEFAULT_DEBOUNCE
+from pagebotsketch.sketchzip import readJson, pageMembers
 from pysketch.sketchclasses import *
 
+COLOR_CACHE_SIZE = 4096 # Maximum number of interned colors.
+
+class FrozenColor(Color):
+    """Color that cannot be altered after construction, as the same instance
+    is shared by many elements. Make a new color to change it.
+
+    >>> c = FrozenColor(r=1, g=0, b=0)
+    >>> c.r = 0.5
+    Traceback (most recent call last):
+    ...
+    AttributeError: FrozenColor is immutable, cannot set "r"
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('%s is immutable, cannot set "%s"' % (self.__class__.__name__, name))
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('%s is immutable, cannot delete "%s"' % (self.__class__.__name__, name))
+        super().__delattr__(name)
+
+    def __eq__(self, c):
+        """Compare as plain Color, as Color.__eq__ requires the class of self.
+
+        >>> FrozenColor(r=1, g=0, b=0) == color(1, 0, 0), color(1, 0, 0) == FrozenColor(r=1, g=0, b=0)
+        (True, True)
+        >>> FrozenColor(r=1, g=0, b=0) != color(1, 0, 0), color(0, 0, 1) != FrozenColor(r=1, g=0, b=0)
+        (False, True)
+        """
+        if not isinstance(c, Color):
+            return False
+        return Color.__eq__(c, self) # Class of c, which self is an instance of.
+
+    def __ne__(self, c):
+        return not self == c
+
+    __hash__ = None # Not hashable, same as Color.
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def internColor(r, g, b, a=None):
+    """Answer the shared FrozenColor instance for the Sketch color values. A
+    design file uses few distinct colors in many layers, so they are created
+    once, immutable, so an edit of one element cannot recolor the others.
+
+    >>> internColor(1, 0, 0) is internColor(1, 0, 0)
+    True
+    >>> c = internColor(1, 0, 0, 0.5)
+    >>> c.r, c.a
+    (1, 0.5)
+    """
+    if a is None:
+        return FrozenColor(r=r, g=g, b=b)
+    return FrozenColor(r=r, g=g, b=b, a=a)
+
+LIB_SKETCHAPP = 'SketchApp' # Key of Sketch specific data in e.lib
+
+DEFAULT_FILL = FrozenColor(r=0.5, g=0.5, b=0.5) # Fill of layers without Sketch fill.
+DEFAULT_TEXTFILL = FrozenColor(r=0, g=0, b=0) # Text color of runs without textFill style.
+
 class SketchContext(BaseContext):
 
     W, H = A4 # Default size of a document, as SketchApp has infinite canvas.
 
     #DOCUMENT_CLASS = Document
 
-    def __init__(self, path=None):
-        """Constructor of Sketch context.
+    # Conversion of Sketch paragraph alignment from and to PageBot xAlign.
+    SKETCH2ALIGNMENT = {0: LEFT, 1: RIGHT, 2: CENTER, None: JUSTIFIED}
+    ALIGNMENT2SKETCH = {LEFT: 0, RIGHT: 1, CENTER: 2, JUSTIFIED: None}
+
+    # Maximum number of SketchAttributes shared by fromBabelString(bs, shared=True)
+    SHARED_ATTRIBUTES_SIZE = 1024
+
+    # Handlers to convert Sketch layers into PageBot elements, by layer class.
+    # Use self.registerLayerHandler to add or overwrite handlers of an instance.
+    LAYERCLASS2HANDLER = {
+        SketchGroup: '_createGroup',
+        SketchShapeGroup: '_createGroup',
+        SketchRectangle: '_createRect',
+        SketchOval: '_createOval',
+        SketchText: '_createText',
+        SketchBitmap: '_createImage',
+        SketchSymbolInstance: '_createSymbolInstance',
+    }
+
+    def __init__(self, path=None, lazy=False, cache=None, stats=None):
+        """Constructor of Sketch context. If @lazy is True, the Sketch file is
+        not parsed up front, but each page is decoded on first use. Optional
+        @cache is a SketchCache, storing the parsed file for the next time.
+        Optional @stats is True or a SketchStats instance, recording the time
+        per phase of reading and saving, shared with the builder.
 
         >>> import pysketch
         >>> from pagebot.toolbox.transformer import path2Dir
@@ -66,16 +164,35 @@ class SketchContext(BaseContext):
         >>> page = doc[1]
         >>> page
         <Page #1 default (576pt, 783pt) E(7)>
-
+        >>> context = SketchContext(path, lazy=True)
+        >>> context.b.pages
+        [<SketchLazyPage name=Page 1 loaded=False>]
+        >>> context = SketchContext(path, stats=True)
+        >>> context.stats is context.b.stats, context.stats['parse'].calls
+        (True, 1)
         """
         super().__init__()
         self.name = self.__class__.__name__
+        self.stats = newStats(stats) # Passed on to every new builder.
         # Keep open connector to the file data. If path is None, a default resource
         # file is opened.
-        self.setPath(path) # Sets self.b to SketchBuilder(path)
+        self.setPath(path, lazy=lazy, cache=cache) # Sets self.b to SketchBuilder(path)
         self.fileType = FILETYPE_SKETCH
         self.shape = None # Current open shape
         self.w = self.h = None # Optional default context size, overwriting the Sketch document.
+        self.layerHandlers = dict(self.LAYERCLASS2HANDLER)
+        self._classHandlers = {} # Cache of resolved handlers {layerClass: handler}
+        self.unsupportedLayers = {} # Count of unsupported layers {className: count}
+        self._sharedAttributes = {} # Shared SketchAttributes by style key.
+        # All SketchAttributes handed out as shared and still in use, also
+        # after the table above was cleared, by identity {id: attributes}.
+        # See self.unshareAttributes.
+        self._sharedInstances = weakref.WeakValueDictionary()
+        self._importState = None # Hashes of the tracked import, see self.readDocument.
+        # If True, images are read from the Sketch file when needed, instead
+        # of from the extracted image files. See self._createImage.
+        self.lazyImages = False
+        self._imageSources = [] # Open SketchImageSource instances, see self.closeImages.
 
     def setSize(self, w=None, h=None):
         """Optional default document size. If not None, overwriting the size of the
@@ -91,8 +208,9 @@ class SketchContext(BaseContext):
         self.w = units(w)
         self.h = units(h)
 
-    def setPath(self, path):
+    def setPath(self, path, lazy=False, cache=None):
         """Set the self.b builder to SketchBuilder(parth), answering self.b.api.
+        In @lazy mode nothing is parsed yet and None is answered.
 
         >>> import pysketch
         >>> context = SketchContext() # Context now interacts with the default Resource file.
@@ -104,76 +222,268 @@ class SketchContext(BaseContext):
         >>> api.filePath.split('/')[-1] # Listening to another file now.
         'TemplateSquare.sketch'
         """
-        self.b = SketchBuilder(path)
+        self.b = SketchBuilder(path, lazy=lazy, cache=cache, stats=self.stats)
+        if self.b.lazy:
+            return None
         return self.b.api
 
+    def iterNameTree(self, layer, tab=0, showClass=False, showFrame=False,
+            showId=False, showCount=False):
+        """Generator answering the lines of the tree of @layer and its
+        descendants, indented by tabs, starting with @tab tabs for @layer.
+        Optionally each line shows the class name, frame, object ID and
+        number of child layers. The time is linear in the number of layers.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
+        >>> context = SketchContext(path)
+        >>> artboard = context.b.artboards[0]
+        >>> lines = list(context.iterNameTree(artboard, showClass=True, showFrame=True, showCount=True))
+        >>> lines[0]
+        '<SketchArtboard name=Artboard 1 w=576 h=783> class=SketchArtboard frame=(0, 0, 576, 783) layers=1\n'
+        """
+        for child, depth, _ in self.b.iterLayers(layer, includeRoot=True):
+            line = '%s%s' % ((tab+depth)*'\t', child)
+            if showClass:
+                line += ' class=%s' % child.__class__.__name__
+            if showFrame and getattr(child, 'frame', None) is not None:
+                frame = child.frame
+                line += ' frame=(%s, %s, %s, %s)' % (frame.x, frame.y, frame.w, frame.h)
+            if showId:
+                line += ' id=%s' % getattr(child, 'do_objectID', None)
+            if showCount:
+                line += ' layers=%d' % len(getattr(child, 'layers', None) or ())
+            yield line + '\n'
+
+    def writeNameTree(self, layer, f, **kwargs):
+        """Write the lines of self.iterNameTree(layer, **kwargs) to the
+        file-like object @f, e.g. to compare the layer structure of Sketch
+        files in a diff.
+
+        >>> import io
+        >>> context = SketchContext()
+        >>> f = io.StringIO()
+        >>> context.writeNameTree(context.b.artboards[0], f)
+        >>> f.getvalue() == context.getNameTree(context.b.artboards[0])
+        True
+        """
+        f.writelines(self.iterNameTree(layer, **kwargs))
+
     def getNameTree(self, layer, t=None, tab=0):
-        if t is None:
-            t = ''
-        t += '%s%s\n' % (tab*'\t', layer)
-        if hasattr(layer, 'layers'):
-            for child in layer.layers:
-                self.getNameTree(child, t, tab+1)
-        return t
+        """Answer the string with the tree of layer names of @layer and all
+        its descendants, one per line, indented by tabs. Optional @t is the
+        string to start with.
+        """
+        return (t or '') + ''.join(self.iterNameTree(layer, tab))
 
     def _extractFill(self, layer):
         if hasattr(layer, 'style') and hasattr(layer.style, 'fills') and layer.style.fills:
             sketchColor = layer.style.fills[0].color
-            return color(r=sketchColor.red, g=sketchColor.green, b=sketchColor.blue)
-        return color(0.5)
+            return internColor(sketchColor.red, sketchColor.green, sketchColor.blue)
+        return DEFAULT_FILL
+
+    def registerLayerHandler(self, layerClass, handler):
+        """Set the @handler that converts Sketch layers of @layerClass (and
+        its subclasses without own handler) into PageBot elements. The
+        handler is a method name of self or a callable, that is called as
+        handler(layer, parentLayer, e), where e is the parent element. It
+        should answer the created element, or None. A handler of None makes
+        the class unsupported.
+
+        >>> context = SketchContext()
+        >>> def createFrameOnly(layer, parentLayer, e):
+        ...     return newRect(name=layer.name, parent=e, sId=layer.do_objectID)
+        >>> context.registerLayerHandler(SketchOval, createFrameOnly)
+        >>> context.getLayerHandler(SketchOval()) is createFrameOnly
+        True
+        >>> context.getLayerHandler(SketchRectangle()) == context._createRect
+        True
+        """
+        self.layerHandlers[layerClass] = handler
+        self._classHandlers = {} # Clear the cache of resolved handlers.
+
+    def getLayerHandler(self, layer):
+        """Answer the handler for the class of @layer, or None if the class
+        is not supported. The handler is resolved once for each class, along
+        its MRO, so subclasses find the handler of their base class.
+        """
+        layerClass = layer.__class__
+        try:
+            return self._classHandlers[layerClass]
+        except KeyError:
+            pass
+        handler = None
+        for baseClass in layerClass.__mro__:
+            if baseClass in self.layerHandlers:
+                handler = self.layerHandlers[baseClass]
+                break
+        if isinstance(handler, str):
+            handler = getattr(self, handler)
+        self._classHandlers[layerClass] = handler
+        return handler
+
+    def _createGroup(self, layer, parentLayer, e):
+        frame = layer.frame
+        return newGroup(name=layer.name, parent=e, sId=layer.do_objectID,
+            x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h)
+
+    def _createRect(self, layer, parentLayer, e):
+        frame = layer.frame
+        fillColor = self._extractFill(parentLayer) # Sketch color is defined in parent
+        return newRect(name=layer.name, parent=e, sId=layer.do_objectID,
+            x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h, fill=fillColor)
+
+    def _createOval(self, layer, parentLayer, e):
+        frame = layer.frame
+        fillColor = self._extractFill(parentLayer) # Sketch color is defined in parent
+        return newOval(name=layer.name, parent=e, sId=layer.do_objectID,
+            x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h, fill=fillColor)
+
+    def _createText(self, layer, parentLayer, e):
+        frame = layer.frame
+        fillColor = self._extractFill(parentLayer) # Sketch color is defined in parent
+        with self.stats.phase('text', items=1):
+            bs = self.asBabelString(layer.attributedString)
+        return newTextBox(bs, name=layer.name, parent=e,
+            sId=layer.do_objectID, x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h,
+            textFill=fillColor)
+
+    def _createImage(self, layer, parentLayer, e):
+        """Create the Image element for the SketchBitmap @layer. If
+        self.lazyImages is True, the element gets no path, but a
+        SketchImageSource in e.lib['SketchApp']['imageSource'], that reads
+        the image from the Sketch file when it is needed. Its extract method
+        answers the path of the image file, for contexts that need it. The
+        sources are owned by self, until self.closeImages. In lazy mode,
+        while the file is not parsed, the image is extracted into the
+        _local/ folder next to the Sketch file, as the images path of the
+        SketchApi would need a parse of the whole file.
+        """
+        with self.stats.phase('images', items=1):
+            return self._newImage(layer, e)
+
+    def _newImage(self, layer, e):
+        frame = layer.frame
+        ref = self.b._imageRef(layer)
+        if self.lazyImages and ref is not None:
+            info = self.b.zipInfos.get(ref) # One zip directory read per file.
+            source = None
+            if info is not None: # Missing in the file, element gets no image.
+                source = SketchImageSource(self.b.filePath, ref, info)
+                self._imageSources.append(source)
+            return newImage(path=None, name=layer.name, parent=e, sId=layer.do_objectID,
+                x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h,
+                lib={LIB_SKETCHAPP: dict(imageSource=source)})
+        if self.b.lazy and not self.b.isLoaded:
+            # Extract the image file, unless it exists with the same content.
+            path = self.lazyImagesPath + layer.name + '.png'
+            if ref is not None and ref in self.b.zipInfos:
+                extractMember(self.b.filePath, ref, path)
+        else:
+            # All internal Sketch file images are converted to .png
+            # SketchApp2Py converts the internal names with long id's to their object
+            # names and copies them into a parallel folder, indicated by self.b.api.sketchFile
+            path = self.b.api.sketchFile.imagesPath + layer.name + '.png'
+        return newImage(path=path, name=layer.name, parent=e, sId=layer.do_objectID,
+            x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h)
+
+    def _get_lazyImagesPath(self):
+        """Answer the _local/ images folder next to the Sketch file, where
+        images are extracted in lazy mode. Create it if it does not exist.
+        """
+        imagesPath = os.path.join(os.path.dirname(self.b.filePath), '_local') + '/'
+        if not os.path.exists(imagesPath):
+            os.makedirs(imagesPath, exist_ok=True)
+        return imagesPath
+    lazyImagesPath = property(_get_lazyImagesPath)
+
+    def closeImages(self):
+        """Close the SketchImageSource instances of the elements created
+        with self.lazyImages. Memoryviews of their images must not be used
+        anymore, reading them again opens the file again.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> from pagebot.document import Document
+        >>> context = SketchContext(path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch')
+        >>> context.lazyImages = True
+        >>> context.readDocument(Document())
+        >>> sources = list(context._imageSources)
+        >>> context.closeImages()
+        >>> context._imageSources, all(source._mmap is None for source in sources)
+        ([], True)
+        """
+        for source in self._imageSources:
+            source.close()
+        self._imageSources = []
+
+    def _createSymbolInstance(self, layer, parentLayer, e):
+        # For now only show the Symbol name.
+        frame = layer.frame
+        return newTextBox('[%s]' % layer.name, name=layer.name, parent=e,
+            sId=layer.do_objectID, fill=0.9, textFill=0, font='Verdana', fontSize=12,
+            x=frame.x, y=e.h - frame.h - frame.y, w=frame.w, h=frame.h)
 
     def _createElements(self, sketchLayer, e):
         """Copy the attributes of the sketchLayer into the element where
-        necessary.
+        necessary. The layer tree is traversed without recursion, by
+        self.b.iterLayers. Layers whose handler answers an element become
+        the parent of the elements of their children. Layers without handler
+        are counted by class name in self.unsupportedLayers.
 
         """
-        for layer in sketchLayer.layers:
-            frame = layer.frame
-            y = e.h - frame.h - frame.y # Flip the y-axis
-            if isinstance(layer, (SketchGroup, SketchShapeGroup)):
-                fillColor = self._extractFill(layer)
-                child = newGroup(name=layer.name, parent=e, sId=layer.do_objectID,
-                    x=frame.x, y=y, w=frame.w, h=frame.h)
-                self._createElements(layer, child)
-
-            elif isinstance(layer, SketchRectangle):
-                fillColor = self._extractFill(sketchLayer) # Sketch color is defined in parent
-                newRect(name=layer.name, parent=e, sId=layer.do_objectID,
-                    x=frame.x, y=y, w=frame.w, h=frame.h, fill=fillColor)
-
-            elif isinstance(layer, SketchOval):
-                fillColor = self._extractFill(sketchLayer) # Sketch color is defined in parent
-                newOval(name=layer.name, parent=e, sId=layer.do_objectID,
-                    x=frame.x, y=y, w=frame.w, h=frame.h, fill=fillColor)
-
-            elif isinstance(layer, SketchText):
-                fillColor = self._extractFill(sketchLayer) # Sketch color is defined in parent
-                newTextBox(self.asBabelString(layer.attributedString), name=layer.name, parent=e,
-                    sId=layer.do_objectID, x=frame.x, y=y, w=frame.w, h=frame.h, textFill=fillColor)
-
-            elif isinstance(layer, SketchBitmap):
-                # All internal Sketch file images are converted to .png
-                # SketchApp2Py converts the internal names with long id's to their object
-                # names and copies them into a parallel folder, indicated by self.b.api.sketchFile
-                path = self.b.api.sketchFile.imagesPath + layer.name + '.png'
-                frame = layer.frame
-                newImage(path=path, name=layer.name, parent=e, sId=layer.do_objectID,
-                    x=frame.x, y=y, w=frame.w, h=frame.h)
-
-            elif isinstance(layer, SketchSymbolInstance):
-                # For now only show the Symbol name.
-                frame = layer.frame
-                newTextBox('[%s]' % layer.name, name=layer.name, parent=e,
-                    sId=layer.do_objectID, fill=0.9, textFill=0, font='Verdana', fontSize=12,
-                    x=frame.x, y=y, w=frame.w, h=frame.h)
+        with self.stats.phase('createElements', items=1):
+            self._createLayerElements(sketchLayer, e)
 
-            else:
-                print('Unsupported layer type', layer)
+    def _createLayerElements(self, sketchLayer, e):
+        elements = {id(sketchLayer): e} # Parent element for the children of a layer.
+        layers = 0
+        for layer, _, parentLayer in self.b.iterLayers(sketchLayer):
+            layers += 1
+            parent = elements.get(id(parentLayer))
+            if parent is None: # Parent layer did not create an element.
+                continue
+            handler = self.getLayerHandler(layer)
+            if handler is None:
+                className = layer.__class__.__name__
+                self.unsupportedLayers[className] = self.unsupportedLayers.get(className, 0) + 1
+                continue
+            child = handler(layer, parentLayer, parent)
+            if child is not None and getattr(layer, 'layers', None):
+                elements[id(layer)] = child
+        self.stats.count('layers', layers)
 
-    def readDocument(self, doc):
+    def extractImages(self, imagesPath=None, threads=None):
+        """Extract the images of the Sketch file into @imagesPath, default the
+        images path of the SketchApi, in a pool of @threads threads. The files
+        are named by the bitmap layers that use them, as expected by
+        self._createImage, so an image used by multiple layers gets a file for
+        each of them. Layers with the same name share one file. Files that
+        already exist with the same content are not written again. Answer
+        the dictionary {path: (member, written)}.
+        """
+        if imagesPath is None:
+            imagesPath = self.b.api.sketchFile.imagesPath
+        names = {} # {member: [fileName, ...]}
+        for page in self.b.pages:
+            for layer, _, _ in self.b.iterLayers(page):
+                if isinstance(layer, SketchBitmap):
+                    ref = self.b._imageRef(layer)
+                    if ref is not None:
+                        names.setdefault(ref, []).append(layer.name + '.png')
+        return extractImages(self.b.filePath, imagesPath, names, threads)
+
+    def readDocument(self, doc, stream=False, processes=None, artboardChunks=1, trackChanges=False):
         """Read Page/Element instances from the SketchApi and fill the Document
         instance doc with them, interpreting SketchPages as chapters and Sketch
-        Artboards as PageBot pages.
+        Artboards as PageBot pages. Each artboard fills the next page of the
+        document.
+
+        If @stream is True and the context is in lazy mode, the artboards are
+        decoded from the file one at a time and released after their elements
+        are created, so peak memory is proportional to one artboard instead
+        of the whole Sketch page.
 
         >>> import pysketch
         >>> from pagebot.document import Document
@@ -188,27 +498,301 @@ class SketchContext(BaseContext):
         >>> e = page.elements[0]
         >>> e
         <Text $Type & sty...$ x=137pt y=134pt w=518pt h=100pt>
+        >>> context = SketchContext(path=path, lazy=True)
+        >>> doc = Document(name='TestStreamDocument')
+        >>> context.readDocument(doc, stream=True)
+        >>> doc[1].elements[0]
+        <Text $Type & sty...$ x=137pt y=134pt w=518pt h=100pt>
+        >>> context.b.pages[0].isLoaded
+        False
+        >>> context.unsupportedLayers
+        {}
+
+        If @processes is defined in lazy mode, the pages are first decoded in
+        a pool of processes (see SketchBuilder.loadPages), then the elements
+        are created in the original page order.
+
+        >>> context = SketchContext(path=path, lazy=True)
+        >>> doc = Document(name='TestParallelDocument')
+        >>> context.readDocument(doc, processes=2)
+        >>> doc[1].elements[0]
+        <Text $Type & sty...$ x=137pt y=134pt w=518pt h=100pt>
+
+        The pages get the do_objectID of their artboard as sId. If
+        @trackChanges is True, the content hashes of all layers are stored,
+        so a new revision of the file can be read by self.updateDocument.
+        This decodes all page members once more (see self._trackImport).
+
+        If the context has stats, the ones of this call are sent to its sink
+        at the end. self.stats itself adds up over calls, until
+        self.stats.reset() is called. Phases
+        can be nested: 'createElements' (items are artboards) includes
+        'text' and 'images'. The items of 'layers' count the converted
+        layers, also when they are streamed.
+
+        >>> operations = []
+        >>> context = SketchContext(path=path, lazy=True, stats=True)
+        >>> context.stats.sink = lambda operation, stats: operations.append(operation)
+        >>> context.readDocument(Document(name='TestStats'))
+        >>> operations, context.stats['createElements'].items, context.stats['text'].calls > 0
+        (['readDocument'], 1, True)
         """
+        if processes is not None and not stream:
+            self.b.loadPages(processes, artboardChunks)
+        self.unsupportedLayers = {}
         sketchPages = self.b.pages # Collect the list of SketchPage instance
         doc.w, doc.h = self.b.size
         #assert doc.originTop # For now, make sure the origin of the document is set on top.
 
-        page = doc[1]
-        for pIndex, sketchPage in enumerate(sketchPages):
-            artboards = sketchPage.layers
+        page = None
+        artboardPages = {} # {artboard.do_objectID: page}
+        for sketchPage in sketchPages:
+            if stream:
+                artboards = self.b.iterArtboards(sketchPage)
+            else:
+                artboards = sketchPage.layers
             for artboard in artboards:
+                if page is None:
+                    page = doc[1]
+                else:
+                    page = page.next
                 page.w = artboard.frame.w
                 page.h = artboard.frame.h
+                page.sId = artboard.do_objectID
+                artboardPages[page.sId] = page
                 self._createElements(artboard, page)
-                if pIndex < len(artboards)-1:
-                    page = page.next
-            if pIndex < len(sketchPages)-1:
-                page = page.next
+        if trackChanges:
+            self._trackImport(artboardPages)
+        self.stats.emit('readDocument')
+
+    def _trackImport(self, artboardPages):
+        """Store the CRC of the page members and the hashes of all layers
+        in the Sketch file, for self.updateDocument. The hashes are made from
+        the JSON in the file, as updateDocument compares them with the JSON
+        of the next revision, so every page member is decoded once more,
+        roughly doubling the decode time of a tracked readDocument.
+        """
+        state = self._importState = dict(crcs={}, hashes={}, artboards=[], pages=artboardPages)
+        with zipfile.ZipFile(self.b.filePath) as zf:
+            for member, _, _ in pageMembers(zf):
+                state['crcs'][member] = zf.getinfo(member).CRC
+                root = hashTree(readJson(zf, member))
+                state['artboards'] += [(member, node.sId) for node in root.children]
+                self._storeHashes(root)
 
-    def save(self, path=None):
+    def _storeHashes(self, root):
+        hashes = self._importState['hashes']
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            hashes[node.sId] = node.hash, node.propsHash
+            stack.extend(node.children)
+
+    def updateDocument(self, doc, path=None):
+        """Update the elements of @doc, as created by self.readDocument(doc,
+        trackChanges=True), to a new revision of the Sketch file at @path, or
+        the current file if None. Page members with the same CRC are not
+        decoded. In changed pages the artboards and layers are matched to the
+        elements by their do_objectID and sId. Layers with the same content
+        hash keep their elements, changed layers get new elements and
+        removed layers lose them, so the time depends on the size of the
+        change. If artboards are added, removed or moved, all pages are
+        read again. Answer a dictionary with statistics.
+
+        >>> import os, shutil, tempfile
+        >>> import pysketch
+        >>> from pagebot.document import Document
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = os.path.join(tempfile.mkdtemp(), 'TemplateText.sketch')
+        >>> _ = shutil.copy(path2Dir(pysketch.__file__) + '/Resources/TemplateText.sketch', path)
+        >>> context = SketchContext(path=path)
+        >>> doc = Document(name='TestUpdateDocument')
+        >>> context.readDocument(doc, trackChanges=True)
+        >>> e = doc[1].elements[0]
+        >>> stats = context.updateDocument(doc) # Nothing changed
+        >>> stats['skippedPages'], stats['patchedArtboards'], doc[1].elements[0] is e
+        (1, 0, True)
+        >>> SketchContext(path=path).updateDocument(doc)
+        Traceback (most recent call last):
+        ...
+        ValueError: [SketchContext] Use readDocument(doc, trackChanges=True) before updateDocument
+
+        Adding, moving or removing artboards rebuilds the document pages,
+        removing the pages of artboards that are gone.
+
+        >>> from pagebotsketch.sketchzip import encodeJson, rewriteArchive
+        >>> sId = doc[1].sId
+        >>> def changeArtboards(change):
+        ...     member = pageMembers(path)[0][0]
+        ...     d = readJson(path, member)
+        ...     change(d['layers'])
+        ...     _ = rewriteArchive(path, path, {member: encodeJson(d)})
+        >>> changeArtboards(lambda layers: layers.append(dict(deepcopy(layers[0]), do_objectID='ADDED')))
+        >>> stats = context.updateDocument(doc)
+        >>> stats['rebuilt'], len(doc.pages), doc[2].sId
+        (True, 2, 'ADDED')
+        >>> changeArtboards(lambda layers: layers.reverse())
+        >>> stats = context.updateDocument(doc)
+        >>> stats['rebuilt'], len(doc.pages), doc[1].sId
+        (True, 2, 'ADDED')
+        >>> changeArtboards(lambda layers: layers.pop(0))
+        >>> stats = context.updateDocument(doc)
+        >>> stats['rebuilt'], len(doc.pages), doc[1].sId == sId
+        (True, 1, True)
+        """
+        state = self._importState
+        if state is None:
+            raise ValueError('[%s] Use readDocument(doc, trackChanges=True) before updateDocument' % self.__class__.__name__)
+        # Only replace self.b when the new file could be read.
+        b = SketchBuilder(path or self.b.filePath, lazy=self.b.lazy, cache=self.b.cache,
+            stats=self.stats)
+        stats = dict(skippedPages=0, changedPages=0, skippedArtboards=0, patchedArtboards=0,
+            createdElements=0, removedElements=0, rebuilt=False)
+        changed = {} # Decoded page members with another CRC {member: d}
+        artboards = []
+        oldArtboards = {}
+        for member, sId in state['artboards']:
+            oldArtboards.setdefault(member, []).append((member, sId))
+        with zipfile.ZipFile(b.filePath) as zf:
+            crcs = {}
+            for member, _, _ in pageMembers(zf):
+                crcs[member] = zf.getinfo(member).CRC
+                if crcs[member] == state['crcs'].get(member):
+                    stats['skippedPages'] += 1
+                    artboards += oldArtboards.get(member, [])
+                else:
+                    stats['changedPages'] += 1
+                    changed[member] = d = readJson(zf, member)
+                    artboards += [(member, layer.get('do_objectID')) for layer in d.get('layers', [])]
+        self.b = b
+        if artboards != state['artboards']:
+            # Artboards were added, removed or moved, read all pages again.
+            oldPages = list(state['pages'].values())
+            for page in oldPages:
+                page.clearElements()
+            self.readDocument(doc, trackChanges=True)
+            # Remove the pages that are left over from removed artboards.
+            newPages = {id(page) for page in self._importState['pages'].values()}
+            for page in oldPages:
+                if id(page) not in newPages:
+                    self._removePage(doc, page)
+            stats['rebuilt'] = True
+            return stats
+        hashes = state['hashes']
+        for member, d in changed.items():
+            root = hashTree(d)
+            for artboardDict, node in zip(d.get('layers', []), root.children):
+                old = hashes.get(node.sId)
+                if old is not None and old[0] == node.hash:
+                    stats['skippedArtboards'] += 1
+                    continue
+                stats['patchedArtboards'] += 1
+                page = state['pages'][node.sId]
+                if old is None or old[1] != node.propsHash:
+                    # Artboard itself changed (e.g. its size), create all elements again.
+                    stats['removedElements'] += len(page.elements)
+                    page.clearElements()
+                    artboard = newLayer(artboardDict)
+                    page.w = artboard.frame.w
+                    page.h = artboard.frame.h
+                    self._createElements(artboard, page)
+                    stats['createdElements'] += len(page.elements)
+                else:
+                    self._patchElements(artboardDict, node, page, stats)
+            self._storeHashes(root)
+            state['crcs'][member] = crcs[member]
+        return stats
+
+    def _removePage(self, doc, page):
+        """Remove the @page from @doc, where doc.pages is {pn: [page, ...]}."""
+        for pn, pnPages in list(doc.pages.items()):
+            pnPages[:] = [pg for pg in pnPages if pg is not page]
+            if not pnPages:
+                del doc.pages[pn]
+
+    def _patchElements(self, d, node, e, stats):
+        """Update the child elements of @e to the child layers of the layer
+        dict @d with hash tree @node, where the properties of @d itself did
+        not change. Child layers with the same hash keep their element.
+        """
+        hashes = self._importState['hashes']
+        stack = [(d, node, e)]
+        while stack:
+            d, node, e = stack.pop()
+            parentLayer = None # Only constructed if a child element is created.
+            bysId = {child.sId: child for child in e.elements if child.sId is not None}
+            elements = []
+            for childDict, childNode in zip(d.get('layers') or [], node.children):
+                child = bysId.pop(childNode.sId, None)
+                old = hashes.get(childNode.sId)
+                if child is not None and old is not None:
+                    if old[0] == childNode.hash: # Same subtree
+                        elements.append(child)
+                        continue
+                    if old[1] == childNode.propsHash and childDict.get('layers'):
+                        elements.append(child) # Same layer, but changed children.
+                        stack.append((childDict, childNode, child))
+                        continue
+                if child is not None:
+                    e.removeElement(child)
+                    stats['removedElements'] += 1
+                if parentLayer is None:
+                    parentLayer = newLayer(dict(d, layers=[]))
+                layer = newLayer(childDict)
+                handler = self.getLayerHandler(layer)
+                if handler is None:
+                    className = layer.__class__.__name__
+                    self.unsupportedLayers[className] = self.unsupportedLayers.get(className, 0) + 1
+                    continue
+                child = handler(layer, parentLayer, e)
+                if child is not None:
+                    stats['createdElements'] += 1
+                    elements.append(child)
+                    if getattr(layer, 'layers', None):
+                        self._createElements(layer, child)
+            for child in bysId.values(): # Layers that were removed.
+                e.removeElement(child)
+                stats['removedElements'] += 1
+            elements += [child for child in e.elements if child.sId is None]
+            if [id(child) for child in elements] != [id(child) for child in e.elements]:
+                e.elements = elements # Restore the order of the layers.
+
+    def watch(self, path, callback, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+            useInotify=None):
+        """Watch the Sketch file at @path, or the current file if None, in a
+        background thread. After the file changed and was stable for
+        @debounce seconds, @callback is called with a SketchChange, telling
+        which members, pages and artboards changed, and with a new
+        SketchBuilder for the file (in the same lazy mode) as change.builder.
+        The callback runs in the watcher thread, so self.b is not replaced
+        there. Set it in the thread that uses self, as self.b = change.builder.
+        Answer the started SketchWatcher, use its stop method to end
+        watching. See SketchWatcher for polling and the optional inotify.
+        """
+        if path is None:
+            path = self.b.filePath
+        lazy, cache = self.b.lazy, self.b.cache # Not read from the watcher thread.
+        def reload(path):
+            return SketchBuilder(path, lazy=lazy, cache=cache, stats=self.stats)
+        return SketchWatcher(path, callback, interval, debounce, useInotify, reload).start()
+
+    def save(self, path=None, incremental=False, profile=None, threads=None):
         """Save the current builder data into Sketch file, indicated by path.
+        If @incremental is True, only the pages that changed since the last
+        save are encoded again, and the other members of the original file
+        are copied raw (see SketchBuilder.saveIncremental). The optional save
+        @profile ('fast', 'balanced' or 'smallest') sets the compression
+        level and if images are stored uncompressed. With a @profile all
+        pages are encoded again, compressing in a pool of @threads, unless
+        @incremental is True as well.
+
+        In lazy mode the pages of self.b.pages are not the ones of the full
+        parse in self.b.api, so the file is always saved incrementally from
+        self.b.pages, encoding the pages that were loaded. Changes made
+        through self.b.api are not saved in lazy mode.
+
         >>> import pysketch
-        >>> from pysketch.sketchappcompare import sketchCompare
+        >>> from pagebotsketch.sketchcompare import compareSketchFiles
         >>> from pagebot.toolbox.transformer import path2Dir
         >>> readPath = path2Dir(pysketch.__file__) + '/Resources/TemplateSquare.sketch'
         >>> context = SketchContext(readPath) # Context now interacts with the reader file.
@@ -217,14 +801,39 @@ class SketchContext(BaseContext):
         ...     os.path.mkdir(exportDir)
         >>> savePath = exportDir + 'TemplateSquare.sketch'
         >>> context.save(savePath)
-        >>> sketchCompare(readPath, savePath)
+        >>> compareSketchFiles(readPath, savePath)
         []
+        >>> writer = context.save(savePath, incremental=True)
+        >>> compareSketchFiles(readPath, savePath)
+        []
+        >>> writer = context.save(savePath, profile='fast')
+        >>> compareSketchFiles(readPath, savePath)
+        []
+        >>> context = SketchContext(readPath, lazy=True)
+        >>> context.b.pages[0].layers[0].name = 'Changed'
+        >>> writer = context.save(savePath)
+        >>> SketchContext(savePath).b.pages[0].layers[0].name
+        'Changed'
 
         TODO: Read/Save should go through the creation and build of Document instance.
         """
+        if self.b.lazy and not incremental and profile is None:
+            self.b.markLoadedDirty()
+            incremental = True
+        if incremental or profile is not None:
+            if not incremental:
+                self.b.markDirty() # Encode all pages
+            writer = self.b.saveIncremental(path, profile, threads)
+            self.stats.emit('save')
+            return writer
         if path is None:
-            path = self.b.sketchApi.filePath
-        self.b.api.save(path)
+            path = self.b.filePath
+        with self.stats.phase('save', items=1):
+            self.b.api.save(path)
+        if os.path.abspath(path) == os.path.abspath(self.b.filePath):
+            self.b.clearDirty()
+            self.b._zipInfos = None
+        self.stats.emit('save')
 
     def newDocument(self, w, h):
         pass
@@ -253,7 +862,7 @@ class SketchContext(BaseContext):
     def getGlyphPath(self, glyph, p=None, path=None):
         pass
 
-    def asBabelString(self, sas):
+    def asBabelString(self, sas, styles=None):
         """Convert the SketchAttributedString skText into a generic BabelString.
 
         * https://developer.apple.com/documentation/foundation/nsattributedstring
@@ -294,32 +903,111 @@ class SketchContext(BaseContext):
         >>> bs2 = context.asBabelString(sas2) # Convert back to pbs
         >>> bs == bs2 # This should be identical, after bi-directional conversion.
         True
+
+        All runs are created in one pass. The style of runs with identical
+        attributes is made once, and every run gets its own copy of it, so
+        altering the style of one run does not change the others. Optional
+        @styles is the dict of made styles by attributes, to reuse them
+        between calls (see self.convertAllText).
+
+        >>> styles = {}
+        >>> bs1, bs2 = context.asBabelString(sas2, styles), context.asBabelString(sas2, styles)
+        >>> bs1.runs[0].style['font'] = 'Verdana'
+        >>> bs2.runs[0].style['font']
+        'Verdana-Bold'
         """
         assert isinstance(sas, SketchAttributedString), "%s.asBabelString: @sas has class %s" % (
             self.__class__.__name__, sas.__class__.__name__)
-        ALIGNMENTS = {0: LEFT, 1: RIGHT, 2: CENTER, None: JUSTIFIED}
-        bsResult = None
+        if styles is None:
+            styles = {} # Style dicts of runs with the same attributes, copied per run.
+        runs = []
+        string = sas.string
         for attrs in sas.attributes:
-            fd = attrs.attributes.MSAttributedStringFontAttribute.attributes
-            cc = attrs.attributes.MSAttributedStringColorAttribute
-            textFill = color(r=cc.red, g=cc.green, b=cc.blue, a=cc.alpha)
-            verticalAlignment = attrs.attributes.textStyleVerticalAlignmentKey
-            tracking = attrs.attributes.kerning # Wrong Sketch name for tracking
-            paragraphStyle = attrs.attributes.paragraphStyle
-
-            style = dict(font=fd.name, fontSize=pt(fd.size), textFill=textFill,
-                tracking=tracking, xAlign=ALIGNMENTS.get(paragraphStyle.alignment, JUSTIFIED))
-            #print('===', style)
-            s = sas.string[attrs.location:attrs.location+attrs.length]
-            bs = BabelString(s, style=style)
-            if bsResult is None:
-                bsResult = bs
-            else:
-                bsResult += bs
-        return bsResult
+            attributes = attrs.attributes
+            fd = attributes.MSAttributedStringFontAttribute.attributes
+            cc = attributes.MSAttributedStringColorAttribute
+            tracking = attributes.kerning # Wrong Sketch name for tracking
+            alignment = attributes.paragraphStyle.alignment
+            key = (fd.name, fd.size, cc.red, cc.green, cc.blue, cc.alpha, tracking, alignment)
+            style = styles.get(key)
+            if style is None:
+                textFill = internColor(cc.red, cc.green, cc.blue, cc.alpha)
+                style = styles[key] = dict(font=fd.name, fontSize=pt(fd.size), textFill=textFill,
+                    tracking=tracking, xAlign=self.SKETCH2ALIGNMENT.get(alignment, JUSTIFIED))
+            # The values are immutable (str, Unit, FrozenColor), a shallow copy will do.
+            runs.append(BabelRun(string[attrs.location:attrs.location+attrs.length], dict(style)))
+        if not runs:
+            return None
+        bs = BabelString()
+        bs.runs = runs
+        return bs
 
-    def fromBabelString(self, bs):
+    def _iterTextLayers(self, scope=None):
+        """Answer the SketchText layers in @scope, which is a page, artboard
+        or layer. If None, answer the SketchText layers of all pages.
         """
+        if scope is None:
+            roots = self.b.pages
+        else:
+            roots = [scope]
+        for root in roots:
+            for layer, _, _ in self.b.iterLayers(root, includeRoot=True):
+                if isinstance(layer, SketchText):
+                    yield layer
+
+    def convertAllText(self, scope=None):
+        """Answer the dictionary {layer.do_objectID: BabelString} with the
+        converted text of all SketchText layers in @scope (see
+        self._iterTextLayers). The styles and colors are looked up in tables
+        that are shared by all layers, so identical styles are made once.
+        Every run gets its own copy of the style dict, so the BabelStrings
+        can be altered independently.
+
+        >>> import pysketch
+        >>> from pagebot.toolbox.transformer import path2Dir
+        >>> path = path2Dir(pysketch.__file__) + '/Resources/TemplateText.sketch'
+        >>> context = SketchContext(path)
+        >>> skTextBox = context.b.artboards[0].layers[0]
+        >>> texts = context.convertAllText(context.b.artboards[0])
+        >>> texts[skTextBox.do_objectID] == context.asBabelString(skTextBox.attributedString)
+        True
+        >>> texts[skTextBox.do_objectID].runs[0].style['font'] = 'Verdana'
+        >>> context.convertAllText(context.b.artboards[0])[skTextBox.do_objectID].runs[0].style['font']
+        'Proforma-Book'
+        >>> sass = context.writeAllText(texts)
+        >>> sass[skTextBox.do_objectID] is skTextBox.attributedString
+        True
+        >>> sass[skTextBox.do_objectID].attributes[0].attributes in context._sharedAttributes.values()
+        False
+        """
+        styles = {}
+        texts = {}
+        for layer in self._iterTextLayers(scope):
+            texts[layer.do_objectID] = self.asBabelString(layer.attributedString, styles)
+        return texts
+
+    def writeAllText(self, texts, shared=False):
+        """Reverse of self.convertAllText. Convert the BabelString values of
+        the dictionary @texts {layer.do_objectID: BabelString} and set them as
+        attributedString of the SketchText layers with these ID's. Answer the
+        dictionary {layer.do_objectID: SketchAttributedString}. Every run
+        gets its own SketchAttributes, as the strings become part of the
+        document. If @shared is True, identical styles share their
+        SketchAttributes (see self.fromBabelString), then use
+        self.unshareAttributes before altering them in the document.
+        """
+        sass = {}
+        for sId, bs in texts.items():
+            layer = self.b.findBysId(sId)
+            if layer is None:
+                continue
+            layer.attributedString = sass[sId] = self.fromBabelString(bs, shared=shared)
+            self.b.markDirty(layer)
+        return sass
+
+    def fromBabelString(self, bs, shared=False):
+        """Convert the BabelString @bs into a SketchAttributedString. The
+        string is joined once after all runs are converted.
 
         >>> bs = BabelString('abcd', style=dict(font='Roboto-Regular', fontSize=pt(18)))
         >>> context = SketchContext()
@@ -329,12 +1017,28 @@ class SketchContext(BaseContext):
         >>> sas2 = context.fromBabelString(bs)
         >>> sas1 == sas2
         True
+
+        If @shared is True, runs with identical styles share their
+        SketchAttributes instance, also between calls, instead of creating
+        new attribute, paragraph style, font descriptor and color objects for
+        every run. Use self.unshareAttributes(sas) before altering the
+        attributes of one run of such a SketchAttributedString.
+
+        >>> bs = BabelString('ab', style=dict(font='Roboto-Regular', fontSize=pt(18)))
+        >>> bs.runs.append(BabelRun('cd', dict(font='Roboto-Regular', fontSize=pt(18))))
+        >>> sas3 = context.fromBabelString(bs, shared=True)
+        >>> sas3.string, sas3 == context.fromBabelString(bs)
+        ('abcd', True)
+        >>> sas3.attributes[0].attributes is sas3.attributes[1].attributes
+        True
+        >>> context.unshareAttributes(sas3)
+        >>> sas3.attributes[0].attributes is sas3.attributes[1].attributes
+        False
         """
         assert isinstance(bs, BabelString)
-        ALIGNMENTS = {LEFT: 0, RIGHT: 1, CENTER: 2, JUSTIFIED: None}
         cIndex = 0
         sas = SketchAttributedString()
-        sas.string = ''
+        strings = []
         style = None
         attrs = sas.attributes
         for run in bs.runs:
@@ -343,24 +1047,74 @@ class SketchContext(BaseContext):
             ssa = SketchStringAttribute()
             ssa.location = cIndex
             ssa.length = len(run.s)
-            sas.string += run.s
+            strings.append(run.s)
             cIndex += ssa.length
+            ssa.attributes = self._getSketchAttributes(style, run.style, shared)
+            attrs.append(ssa)
+        sas.string = ''.join(strings)
+        return sas
 
-            ssa.attributes = SketchAttributes()
-            ssa.attributes.kerning = style.get('tracking', 0)
-            ssa.attributes.textStyleVerticalAlignmentKey = 0 # ???
-            ssa.attributes.paragraphStyle = SketchParagraphStyle()
-            ssa.attributes.paragraphStyle.alignment = ALIGNMENTS.get(style.get('xAlign', JUSTIFIED))
+    def _getSketchAttributes(self, style, runStyle, shared=False):
+        """Answer the SketchAttributes for the (cascaded) @style and the
+        @runStyle of a BabelRun. If @shared is True, answer the same instance
+        for identical styles.
+        """
+        tracking = style.get('tracking', 0)
+        alignment = self.ALIGNMENT2SKETCH.get(style.get('xAlign', JUSTIFIED))
+        fontName = runStyle.get('font', 'Verdana')
+        fontSize = upt(runStyle.get('fontSize', 12))
+        tc = runStyle.get('textFill', DEFAULT_TEXTFILL)
+        key = None
+        if shared:
+            key = (tracking, alignment, fontName, fontSize, tc.r, tc.g, tc.b, tc.a)
+            try:
+                attributes = self._sharedAttributes.get(key)
+            except TypeError: # Unhashable style value, don't share.
+                key = attributes = None
+            if attributes is not None:
+                return attributes
+        attributes = SketchAttributes()
+        attributes.kerning = tracking
+        attributes.textStyleVerticalAlignmentKey = 0 # ???
+        attributes.paragraphStyle = SketchParagraphStyle()
+        attributes.paragraphStyle.alignment = alignment
 
-            ssa.attributes.MSAttributedStringFontAttribute = SketchFontDescriptor()
-            fd = ssa.attributes.MSAttributedStringFontAttribute.attributes
-            fd.name = run.style.get('font', 'Verdana')
-            fd.size = upt(run.style.get('fontSize', 12))
-            tc = run.style.get('textFill', color(0))
+        attributes.MSAttributedStringFontAttribute = SketchFontDescriptor()
+        fd = attributes.MSAttributedStringFontAttribute.attributes
+        fd.name = fontName
+        fd.size = fontSize
 
-            ssa.attributes.MSAttributedStringColorAttribute = SketchColor(red=tc.r, green=tc.g, blue=tc.b, alpha=tc.a)
-            attrs.append(ssa)
-        return sas
+        attributes.MSAttributedStringColorAttribute = SketchColor(red=tc.r, green=tc.g, blue=tc.b, alpha=tc.a)
+        if key is not None:
+            if len(self._sharedAttributes) >= self.SHARED_ATTRIBUTES_SIZE:
+                self._sharedAttributes = {}
+            self._sharedAttributes[key] = attributes
+            self._sharedInstances[id(attributes)] = attributes
+        return attributes
+
+    def unshareAttributes(self, sas):
+        """Give every run of the SketchAttributedString @sas its own copy of
+        shared SketchAttributes, so they can be altered without changing the
+        other runs and strings that share them (copy-on-write). Attributes
+        that were shared before the table of shared attributes was cleared
+        (see SHARED_ATTRIBUTES_SIZE) are copied too.
+
+        >>> context = SketchContext()
+        >>> bs = BabelString('ab', style=dict(font='Roboto-Regular', fontSize=pt(18)))
+        >>> sas1 = context.fromBabelString(bs, shared=True)
+        >>> context._sharedAttributes = {} # As if the table was full.
+        >>> sas2 = context.fromBabelString(bs, shared=True)
+        >>> shared = sas1.attributes[0].attributes
+        >>> context.unshareAttributes(sas1)
+        >>> sas1.attributes[0].attributes is shared
+        False
+        """
+        seen = set()
+        for ssa in sas.attributes:
+            attributesId = id(ssa.attributes)
+            if attributesId in seen or self._sharedInstances.get(attributesId) is ssa.attributes:
+                ssa.attributes = deepcopy(ssa.attributes)
+            seen.add(attributesId)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,264 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchgenerate.py
+#
+#     Generator of synthetic .sketch files of any size, for benchmarks and
+#     tests. The layer dicts follow the format of files written by Sketch 52+,
+#     with rectangles, ovals, texts with multiple runs, bitmaps and nested
+#     groups. The same arguments and seed always write the same file.
+#
+import hashlib
+import random
+import struct
+import zipfile
+import zlib
+
+from pagebotsketch.sketchzip import (DOCUMENT_JSON, META_JSON, USER_JSON, PAGES_JSON,
+    IMAGES_JSON, PREVIEWS_JSON, encodeJson)
+
+SKETCH_VERSION = 119 # Format version of Sketch 60
+APP_VERSION = '60'
+GROUP_RATIO = 0.15 # Part of the layers that become a group, if the depth allows.
+IMAGE_SIZE = 64 # Width and height in pixels of the generated bitmaps.
+FONTS = ('Helvetica', 'Helvetica-Bold', 'Georgia', 'Verdana')
+WORDS = ('Type', 'style', 'layout', 'grid', 'page', 'sketch', 'design', 'element', 'color', 'baseline')
+
+class SketchGenerator:
+    """Generator of the JSON members of a synthetic Sketch document.
+
+    >>> g = SketchGenerator(seed=1)
+    >>> layer = g.text(0, 0, 100, 20, runs=3)
+    >>> layer['_class'], len(layer['attributedString']['attributes'])
+    ('text', 3)
+    >>> SketchGenerator(seed=1).uuid() == SketchGenerator(seed=1).uuid()
+    True
+    """
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.images = {} # {member: pngData}
+        self.count = 0 # Number of created dicts, to make unique names.
+
+    def uuid(self):
+        r = self.random.getrandbits(128)
+        h = '%032X' % r
+        return '%s-%s-%s-%s-%s' % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+
+    def color(self):
+        return dict(_class='color', alpha=1, red=round(self.random.random(), 4),
+            green=round(self.random.random(), 4), blue=round(self.random.random(), 4))
+
+    def style(self, fill=True):
+        style = dict(_class='style', do_objectID=self.uuid(), endMarkerType=0, miterLimit=10,
+            startMarkerType=0, windingRule=1,
+            borderOptions=dict(_class='borderOptions', isEnabled=True, dashPattern=[],
+                lineCapStyle=0, lineJoinStyle=0))
+        if fill:
+            style['fills'] = [dict(_class='fill', isEnabled=True, color=self.color(), fillType=0,
+                noiseIndex=0, noiseIntensity=0, patternFillType=1, patternTileScale=1)]
+        return style
+
+    def layer(self, className, x, y, w, h, name=None, **kwargs):
+        """Answer the dict with the attributes that all layers have."""
+        self.count += 1
+        d = dict(_class=className, do_objectID=self.uuid(), booleanOperation=-1,
+            exportOptions=dict(_class='exportOptions', exportFormats=[], includedLayerIds=[],
+                layerOptions=0, shouldTrim=False),
+            frame=dict(_class='rect', constrainProportions=False, x=x, y=y, width=w, height=h),
+            isFixedToViewport=False, isFlippedHorizontal=False, isFlippedVertical=False,
+            isLocked=False, isVisible=True, layerListExpandedType=0,
+            name=name or '%s %d' % (className.capitalize(), self.count),
+            nameIsFixed=False, resizingConstraint=63, resizingType=0, rotation=0,
+            shouldBreakMaskChain=False)
+        d.update(kwargs)
+        return d
+
+    def _points(self, points, curveMode=1):
+        return [dict(_class='curvePoint', cornerRadius=0, curveFrom='{%s, %s}' % p,
+            curveMode=curveMode, curveTo='{%s, %s}' % p, hasCurveFrom=False, hasCurveTo=False,
+            point='{%s, %s}' % p) for p in points]
+
+    def rectangle(self, x, y, w, h):
+        return self.layer('rectangle', x, y, w, h, style=self.style(), edited=False,
+            isClosed=True, pointRadiusBehaviour=1, fixedRadius=0, hasConvertedToNewRoundCorners=True,
+            points=self._points(((0, 0), (1, 0), (1, 1), (0, 1))))
+
+    def oval(self, x, y, w, h):
+        return self.layer('oval', x, y, w, h, style=self.style(), edited=False,
+            isClosed=True, pointRadiusBehaviour=1,
+            points=self._points(((0.5, 1), (1, 0.5), (0.5, 0), (0, 0.5)), curveMode=2))
+
+    def _textAttributes(self, font, fontSize, color):
+        return dict(
+            MSAttributedStringFontAttribute=dict(_class='fontDescriptor',
+                attributes=dict(name=font, size=fontSize)),
+            MSAttributedStringColorAttribute=color,
+            kerning=0,
+            paragraphStyle=dict(_class='paragraphStyle', alignment=self.random.randint(0, 3)))
+
+    def text(self, x, y, w, h, runs=1):
+        """Answer a text layer with @runs runs of different styles."""
+        attributes = []
+        strings = []
+        location = 0
+        for _ in range(runs):
+            s = ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(1, 6))) + ' '
+            attributes.append(dict(_class='stringAttribute', location=location, length=len(s),
+                attributes=self._textAttributes(self.random.choice(FONTS),
+                    self.random.choice((9, 10, 12, 14, 18, 24)), self.color())))
+            strings.append(s)
+            location += len(s)
+        style = self.style(fill=False)
+        style['textStyle'] = dict(_class='textStyle', verticalAlignment=0,
+            encodedAttributes=attributes[0]['attributes'])
+        return self.layer('text', x, y, w, h, style=style, automaticallyDrawOnUnderlyingPath=False,
+            dontSynchroniseWithSymbol=False, glyphBounds='{{0, 0}, {%s, %s}}' % (w, h),
+            lineSpacingBehaviour=2, textBehaviour=1,
+            attributedString=dict(_class='attributedString', string=''.join(strings),
+                attributes=attributes))
+
+    def bitmap(self, x, y, w, h):
+        """Answer a bitmap layer, with a new image in self.images."""
+        data = pngImage(IMAGE_SIZE, IMAGE_SIZE, self.random)
+        member = '%s%s.png' % (IMAGES_JSON, hashlib.sha1(data).hexdigest())
+        self.images[member] = data
+        return self.layer('bitmap', x, y, w, h, style=self.style(fill=False),
+            clippingMask='{{0, 0}, {1, 1}}', fillReplacesImage=False, intendedDPI=72,
+            image=dict(_class='MSJSONFileReference', _ref_class='MSImageData', _ref=member))
+
+    def group(self, x, y, w, h):
+        return self.layer('group', x, y, w, h, style=self.style(fill=False),
+            hasClickThrough=False, layers=[])
+
+    def artboard(self, x, y, w, h, name=None):
+        return self.layer('artboard', x, y, w, h, name=name, style=self.style(),
+            booleanOperation=0, hasClickThrough=True, backgroundColor=self.color(),
+            hasBackgroundColor=False, includeBackgroundColorInExport=False,
+            includeInCloudUpload=True, isFlowHome=False, presetDictionary={}, resizesContent=False,
+            horizontalRulerData=dict(_class='rulerData', base=0, guides=[]),
+            verticalRulerData=dict(_class='rulerData', base=0, guides=[]), layers=[])
+
+    def fillArtboard(self, artboard, layers, depth, textRuns, bitmaps):
+        """Add @layers layers to @artboard, of which @bitmaps bitmaps, with
+        groups nested to @depth. The layers are placed in their parent.
+        """
+        containers = [(artboard, 0)]
+        leafTypes = (self.rectangle, self.oval, self.text)
+        for index in range(layers):
+            parent, level = self.random.choice(containers)
+            frame = parent['frame']
+            pw, ph = frame['width'], frame['height']
+            w = max(1, round(self.random.uniform(0.1, 0.5) * pw))
+            h = max(1, round(self.random.uniform(0.1, 0.5) * ph))
+            x = round(self.random.uniform(0, pw - w))
+            y = round(self.random.uniform(0, ph - h))
+            if index < bitmaps:
+                layer = self.bitmap(x, y, w, h)
+            elif level < depth - 1 and self.random.random() < GROUP_RATIO:
+                layer = self.group(x, y, w, h)
+                containers.append((layer, level + 1))
+            else:
+                create = self.random.choice(leafTypes)
+                if create == self.text:
+                    layer = self.text(x, y, w, h, runs=textRuns)
+                else:
+                    layer = create(x, y, w, h)
+            parent['layers'].append(layer)
+
+    def page(self, name, artboards, layers, depth, textRuns, bitmaps, artboardSize=(1024, 768)):
+        """Answer the page dict, with its artboards in a row."""
+        w, h = artboardSize
+        page = self.layer('page', 0, 0, 0, 0, name=name, style=self.style(fill=False),
+            booleanOperation=0, hasClickThrough=True, includeInCloudUpload=True,
+            horizontalRulerData=dict(_class='rulerData', base=0, guides=[]),
+            verticalRulerData=dict(_class='rulerData', base=0, guides=[]), layers=[])
+        for index in range(artboards):
+            artboard = self.artboard(index * (w + 100), 0, w, h, name='Artboard %d' % (index + 1))
+            # Divide the bitmaps over the artboards.
+            count = bitmaps // artboards + (1 if index < bitmaps % artboards else 0)
+            self.fillArtboard(artboard, layers, depth, textRuns, count)
+            page['layers'].append(artboard)
+        return page
+
+def pngImage(w, h, rnd):
+    """Answer the data of an RGB PNG image of @w x @h pixels, filled with
+    noise from the random.Random instance @rnd.
+
+    >>> data = pngImage(4, 2, random.Random(0))
+    >>> data[:8] == b'\\x89PNG\\r\\n\\x1a\\n', struct.unpack('>LL', data[16:24])
+    (True, (4, 2))
+    """
+    def chunk(chunkType, data):
+        return struct.pack('>L', len(data)) + chunkType + data + struct.pack('>L', zlib.crc32(chunkType + data))
+    rows = b''.join(b'\0' + bytes(rnd.getrandbits(8) for _ in range(3 * w)) for _ in range(h))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>LLBBBBB', w, h, 8, 2, 0, 0, 0)) +
+        chunk(b'pHYs', struct.pack('>LLB', 2835, 2835, 1)) + chunk(b'IDAT', zlib.compress(rows)) +
+        chunk(b'IEND', b''))
+
+def generateSketch(path, pages=1, artboards=4, layers=50, depth=3, textRuns=3, bitmaps=0, seed=0):
+    """Write a synthetic .sketch file at @path, with @pages pages of
+    @artboards artboards, each with @layers layers (groups and leaves)
+    nested up to @depth levels. Text layers have @textRuns runs. There are
+    @bitmaps bitmap layers per page, each with its own image. Answer a
+    dictionary with the number of pages, artboards, layers and images.
+
+    >>> import os, tempfile
+    >>> from pagebotsketch.sketchzip import pageMembers, readJson
+    >>> path = os.path.join(tempfile.mkdtemp(), 'Generated.sketch')
+    >>> generateSketch(path, pages=2, artboards=3, layers=10, bitmaps=2)
+    {'pages': 2, 'artboards': 6, 'layers': 60, 'images': 4}
+    >>> [name for _, _, name in pageMembers(path)]
+    ['Page 1', 'Page 2']
+    >>> len(readJson(path, pageMembers(path)[0][0])['layers'])
+    3
+    """
+    g = SketchGenerator(seed)
+    pageDicts = []
+    pagesAndArtboards = {}
+    for index in range(pages):
+        page = g.page('Page %d' % (index + 1), artboards, layers, depth, textRuns, bitmaps)
+        pageDicts.append(page)
+        pagesAndArtboards[page['do_objectID']] = dict(name=page['name'],
+            artboards={artboard['do_objectID']: dict(name=artboard['name']) for artboard in page['layers']})
+    document = dict(_class='document', do_objectID=g.uuid(), colorSpace=0, currentPageIndex=0,
+        assets=dict(_class='assetCollection', do_objectID=g.uuid(), colorAssets=[], colors=[],
+            gradientAssets=[], gradients=[], images=[], imageCollection=dict(_class='imageCollection', images={})),
+        foreignLayerStyles=[], foreignSymbols=[], foreignTextStyles=[],
+        layerStyles=dict(_class='sharedStyleContainer', objects=[]),
+        layerTextStyles=dict(_class='sharedTextStyleContainer', objects=[]),
+        pages=[dict(_class='MSJSONFileReference', _ref_class='MSImmutablePage',
+            _ref=PAGES_JSON + page['do_objectID']) for page in pageDicts])
+    meta = dict(commit='', pagesAndArtboards=pagesAndArtboards, version=SKETCH_VERSION,
+        fonts=list(FONTS), compatibilityVersion=99, app='com.bohemiancoding.sketch3',
+        autosaved=0, variant='NONAPPSTORE', created=dict(commit='', appVersion=APP_VERSION,
+            build=0, app='com.bohemiancoding.sketch3', compatibilityVersion=99,
+            version=SKETCH_VERSION, variant='NONAPPSTORE'),
+        saveHistory=['NONAPPSTORE.0'], appVersion=APP_VERSION, build=0)
+    user = dict(document=dict(pageListHeight=100, pageListCollapsed=0))
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(DOCUMENT_JSON, encodeJson(document))
+        for page in pageDicts:
+            zf.writestr(PAGES_JSON + page['do_objectID'] + '.json', encodeJson(page))
+        for member, data in g.images.items():
+            zf.writestr(member, data)
+        zf.writestr(META_JSON, encodeJson(meta))
+        zf.writestr(USER_JSON, encodeJson(user))
+        zf.writestr(PREVIEWS_JSON + 'preview.png', pngImage(IMAGE_SIZE, IMAGE_SIZE, g.random))
+    return dict(pages=pages, artboards=pages * artboards, layers=pages * artboards * layers,
+        images=len(g.images))
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
@@ -0,0 +1,369 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchimages.py
+#
+#     Extraction and header probing of the images/* members of a .sketch file.
+#
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from pagebotsketch.sketchzip import IMAGES_JSON, LOCAL_HEADER
+
+COPY_BUFFER = 256*1024 # Size of the blocks copied from zip member to file.
+PROBE_LIMIT = 64*1024 # Maximum number of bytes read to find the image info.
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COLORTYPES = {0: 'gray', 2: 'rgb', 3: 'indexed', 4: 'grayalpha', 6: 'rgba'}
+JPEG_COLORTYPES = {1: 'gray', 3: 'ycbcr', 4: 'cmyk'}
+# JPEG start of frame markers, except DHT (C4), JPG (C8) and DAC (CC)
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def fileMatches(path, info, bufferSize=COPY_BUFFER):
+    """Answer the boolean flag if the file at @path has the same content as
+    the zip member with ZipInfo @info. The size and CRC-32 of the member are
+    known from the zip directory, so the member is not decompressed. Note
+    that the SHA-1 names of the image members cannot be used for this, as
+    Sketch hashes the originally imported image, not the stored one.
+    """
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+    except OSError: # File does not exist.
+        return False
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(bufferSize), b''):
+            crc = zlib.crc32(block, crc)
+    return crc == info.CRC
+
+def extractMember(path, member, targetPath, bufferSize=COPY_BUFFER):
+    """Extract the zip @member of the .sketch file @path to @targetPath,
+    unless a file with the same content already exists. The member is
+    copied in blocks of @bufferSize, through a unique temporary file in the
+    same directory. Answer the boolean flag if the file was written.
+    """
+    with zipfile.ZipFile(path, mode='r') as zf:
+        info = zf.getinfo(member)
+        if fileMatches(targetPath, info, bufferSize):
+            return False
+        # Unique per process and thread, created exclusively.
+        tmpPath = '%s.tmp%d.%d' % (targetPath, os.getpid(), threading.get_ident())
+        try:
+            with zf.open(info) as src, open(tmpPath, 'xb') as dst:
+                shutil.copyfileobj(src, dst, bufferSize)
+            os.replace(tmpPath, targetPath)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+    return True
+
+def extractImages(path, imagesDir, names=None, threads=None, bufferSize=COPY_BUFFER):
+    """Extract the images/* members of the .sketch file @path into @imagesDir,
+    using a pool of @threads threads. Optional @names is a dictionary
+    {member: fileName} for the target files, where fileName can also be a
+    list of file names, if the image is used by multiple layers. Otherwise
+    the file name of the member is used. File names are relative to
+    @imagesDir, unless they are absolute paths. Every target file is
+    written once; if multiple members have the same target, the first one
+    in the archive gets it. Members with an existing target file of the
+    same content are skipped. Answer the dictionary
+    {targetPath: (member, written)}.
+
+    >>> import tempfile
+    >>> tmpDir = tempfile.mkdtemp()
+    >>> path = os.path.join(tmpDir, 'Test.sketch')
+    >>> member = IMAGES_JSON + '0b1e89081976855267a5c0a758434aefc484a9e7.png'
+    >>> with zipfile.ZipFile(path, 'w') as zf:
+    ...     zf.writestr(member, b'PNG image data')
+    ...     zf.writestr(IMAGES_JSON + 'other.png', b'Other PNG image data')
+    >>> names = {member: ['Image.png', 'Copy.png'], IMAGES_JSON + 'other.png': 'Image.png'}
+    >>> result = extractImages(path, tmpDir, names)
+    >>> sorted((os.path.basename(p), m == member, written) for p, (m, written) in result.items())
+    [('Copy.png', True, True), ('Image.png', True, True)]
+    >>> result = extractImages(path, tmpDir, names) # Skipped
+    >>> sorted(written for _, written in result.values())
+    [False, False]
+    """
+    if not os.path.exists(imagesDir):
+        os.makedirs(imagesDir)
+    if names is None:
+        names = {}
+    with zipfile.ZipFile(path, mode='r') as zf:
+        members = [name for name in zf.namelist()
+            if name.startswith(IMAGES_JSON) and not name.endswith('/')]
+    targets = {} # {targetPath: member}, each target written once.
+    for member in members:
+        fileNames = names.get(member, os.path.basename(member))
+        if isinstance(fileNames, str):
+            fileNames = [fileNames]
+        for fileName in fileNames:
+            targets.setdefault(os.path.join(imagesDir, fileName), member)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        written = pool.map(lambda args: extractMember(path, args[1], args[0], bufferSize=bufferSize),
+            targets.items())
+        return {targetPath: (member, flag) for (targetPath, member), flag in zip(targets.items(), written)}
+
+class SketchImageInfo:
+    """Image properties read from the header of a PNG or JPEG image."""
+    def __init__(self, format, w, h, colorType=None, bitDepth=None, dpi=None):
+        self.format = format # 'png' or 'jpeg'
+        self.w = w # Size in pixels
+        self.h = h
+        self.colorType = colorType # E.g. 'rgb', 'rgba', 'gray', 'cmyk'
+        self.bitDepth = bitDepth
+        self.dpi = dpi # Tuple (x, y) or None if not defined in the file.
+
+    def __repr__(self):
+        return '<%s %s w=%d h=%d %s dpi=%s>' % (self.__class__.__name__, self.format,
+            self.w, self.h, self.colorType, self.dpi)
+
+def _probePng(f):
+    """Answer the SketchImageInfo of the PNG stream @f, positioned after the
+    signature, reading chunk headers until the image data starts.
+    """
+    info = None
+    read = 0
+    while read < PROBE_LIMIT:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunkType = struct.unpack('>L4s', header)
+        read += 8 + length + 4
+        if chunkType == b'IHDR':
+            w, h, bitDepth, colorType = struct.unpack('>LLBB', f.read(10))
+            info = SketchImageInfo('png', w, h, PNG_COLORTYPES.get(colorType), bitDepth)
+            f.read(length - 10 + 4)
+        elif chunkType == b'pHYs' and info is not None:
+            ppuX, ppuY, unit = struct.unpack('>LLB', f.read(9))
+            if unit == 1: # Pixels per meter
+                info.dpi = (round(ppuX * 0.0254), round(ppuY * 0.0254))
+            f.read(4)
+        elif chunkType in (b'IDAT', b'IEND'): # pHYs must be before the data.
+            break
+        else:
+            f.read(length + 4)
+    return info
+
+def _probeJpeg(f):
+    """Answer the SketchImageInfo of the JPEG stream @f, positioned after the
+    start of image marker, reading marker segments until the frame header.
+    """
+    dpi = None
+    read = 0
+    while read < PROBE_LIMIT:
+        marker = f.read(2)
+        while marker[:1] == b'\xff' and marker[1:] == b'\xff': # Fill bytes
+            marker = marker[1:] + f.read(1)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0x01 or 0xD0 <= code <= 0xD7: # Markers without segment.
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        read += 2 + length
+        data = f.read(length - 2)
+        if code in JPEG_SOF:
+            bitDepth, h, w, components = struct.unpack('>BHHB', data[:6])
+            return SketchImageInfo('jpeg', w, h, JPEG_COLORTYPES.get(components), bitDepth, dpi)
+        if code == 0xE0 and data[:5] == b'JFIF\x00':
+            unit, xDensity, yDensity = struct.unpack('>BHH', data[7:12])
+            if unit == 1: # Dots per inch
+                dpi = (xDensity, yDensity)
+            elif unit == 2: # Dots per cm
+                dpi = (round(xDensity * 2.54), round(yDensity * 2.54))
+        elif code == 0xDA: # Start of scan, no frame header found.
+            break
+    return None
+
+class _Prefixed:
+    """Binary stream that first answers the bytes already read from @f."""
+    def __init__(self, prefix, f):
+        self.prefix = prefix
+        self.f = f
+
+    def read(self, n):
+        s = self.prefix[:n]
+        self.prefix = self.prefix[n:]
+        if len(s) < n:
+            s += self.f.read(n - len(s))
+        return s
+
+def probeImage(f):
+    """Answer the SketchImageInfo from the header of the PNG or JPEG image in
+    the binary stream @f, only reading the first chunks or segments. Answer
+    None for other formats.
+
+    >>> import io
+    >>> ihdr = struct.pack('>LLBBBBB', 640, 480, 8, 6, 0, 0, 0)
+    >>> phys = struct.pack('>LLB', 2835, 2835, 1)
+    >>> def chunk(chunkType, data):
+    ...     return struct.pack('>L', len(data)) + chunkType + data + b'CRC!'
+    >>> png = PNG_SIGNATURE + chunk(b'IHDR', ihdr) + chunk(b'pHYs', phys) + chunk(b'IDAT', b'')
+    >>> probeImage(io.BytesIO(png))
+    <SketchImageInfo png w=640 h=480 rgba dpi=(72, 72)>
+    >>> jfif = b'JFIF\\x00\\x01\\x01' + struct.pack('>BHHBB', 1, 300, 300, 0, 0)
+    >>> sof = struct.pack('>BHHB', 8, 200, 100, 3)
+    >>> def segment(code, data):
+    ...     return b'\\xff' + bytes([code]) + struct.pack('>H', len(data) + 2) + data
+    >>> jpeg = b'\\xff\\xd8' + segment(0xE0, jfif) + segment(0xC0, sof)
+    >>> probeImage(io.BytesIO(jpeg))
+    <SketchImageInfo jpeg w=100 h=200 ycbcr dpi=(300, 300)>
+    >>> probeImage(io.BytesIO(b'GIF89a')) is None
+    True
+    """
+    signature = f.read(8)
+    if signature == PNG_SIGNATURE:
+        return _probePng(f)
+    if signature[:2] == b'\xff\xd8':
+        return _probeJpeg(_Prefixed(signature[2:], f))
+    return None
+
+def probeImages(path, members=None):
+    """Answer the dictionary {member: SketchImageInfo} for the image @members
+    in the .sketch file @path, opening the archive only once. If @members
+    is None, then all images/* members are probed. Members that are not
+    in the archive or are no PNG or JPEG image answer None.
+
+    >>> import io
+    >>> data = io.BytesIO()
+    >>> ihdr = struct.pack('>LLBBBBB', 16, 8, 8, 2, 0, 0, 0)
+    >>> with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as zf:
+    ...     zf.writestr(IMAGES_JSON + 'a.png', PNG_SIGNATURE + struct.pack('>L', 13) + b'IHDR' + ihdr + bytes(1000))
+    ...     zf.writestr(IMAGES_JSON + 'b.gif', b'GIF89a')
+    >>> probeImages(data)
+    {'images/a.png': <SketchImageInfo png w=16 h=8 rgb dpi=None>, 'images/b.gif': None}
+    """
+    infos = {}
+    with zipfile.ZipFile(path, mode='r') as zf:
+        if members is None:
+            members = [name for name in zf.namelist() if name.startswith(IMAGES_JSON)]
+        for member in members:
+            if member not in zf.NameToInfo:
+                infos[member] = None
+                continue
+            with zf.open(member) as f: # Only decompresses what is read.
+                infos[member] = probeImage(f)
+    return infos
+
+class SketchImageSource:
+    """Handle to an image member in a .sketch file, that only reads the image
+    data when it is needed. Images that are STORED (not compressed) in the
+    zip archive are answered by self.memoryview as a zero-copy slice of the
+    memory mapped file. Contexts that need a real file
+    can call self.extract.
+
+    >>> import tempfile
+    >>> tmpDir = tempfile.mkdtemp()
+    >>> path = os.path.join(tmpDir, 'Test.sketch')
+    >>> with zipfile.ZipFile(path, 'w') as zf:
+    ...     zf.writestr('images/A.png', b'PNG image data', zipfile.ZIP_STORED)
+    >>> source = SketchImageSource(path, 'images/A.png')
+    >>> source
+    <SketchImageSource images/A.png size=14>
+    >>> bytes(source.memoryview()[:3]), source.read()
+    (b'PNG', b'PNG image data')
+    >>> os.path.basename(source.extract(tmpDir, 'Image.png'))
+    'Image.png'
+    >>> source.close()
+
+    Optional @info is the ZipInfo of the member, to avoid reading the zip
+    directory for every image, e.g. from SketchBuilder.zipInfos.
+    """
+    def __init__(self, path, member, info=None):
+        self.path = path # Path of the .sketch file.
+        self.member = member
+        if info is None:
+            with zipfile.ZipFile(path, mode='r') as zf:
+                info = zf.getinfo(member)
+        self.info = info
+        self._file = None
+        self._mmap = None
+
+    def __repr__(self):
+        return '<%s %s size=%d>' % (self.__class__.__name__, self.member, self.size)
+
+    def _get_size(self):
+        """Answer the size of the image data in bytes."""
+        return self.info.file_size
+    size = property(_get_size)
+
+    def _get_isStored(self):
+        """Answer the boolean flag if the image is not compressed in the file."""
+        return self.info.compress_type == zipfile.ZIP_STORED
+    isStored = property(_get_isStored)
+
+    def open(self):
+        """Answer a readable file object for the image data."""
+        zf = zipfile.ZipFile(self.path, mode='r')
+        f = zf.open(self.info)
+        zf.close() # The member file object keeps the archive file open.
+        return f
+
+    def probe(self):
+        """Answer the SketchImageInfo of the image, decompressing only the
+        first bytes of the member, or None if it is no PNG or JPEG image.
+        """
+        with self.open() as f:
+            return probeImage(f)
+
+    def read(self):
+        """Answer the image data as bytes."""
+        with self.open() as f:
+            return f.read()
+
+    def memoryview(self):
+        """Answer a memoryview of the image data. For stored images this is a
+        slice of the memory mapped .sketch file, without copying the data.
+        """
+        if not self.isStored or self.size == 0:
+            return memoryview(self.read())
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = self.info.header_offset
+        header = LOCAL_HEADER.unpack_from(self._mmap, offset)
+        start = offset + LOCAL_HEADER.size + header[-2] + header[-1] # Skip name and extra field.
+        return memoryview(self._mmap)[start:start+self.size]
+
+    def extract(self, imagesDir, fileName=None):
+        """Write the image into @imagesDir, as @fileName or the name of the
+        member, unless it exists with the same content. Answer the path.
+        """
+        if not os.path.exists(imagesDir):
+            os.makedirs(imagesDir)
+        targetPath = os.path.join(imagesDir, fileName or os.path.basename(self.member))
+        extractMember(self.path, self.member, targetPath)
+        return targetPath
+
+    def close(self):
+        """Release the memory mapped file. Memoryviews answered before must
+        not be used anymore.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchlazypage.py
+#
+#     Proxy for a SketchPage that only reads and decodes its page member
+#     in the .sketch zip archive when the page content is needed.
+#
+import json
+import zipfile
+
+from pysketch.sketchclasses import SketchPage
+
+from pagebotsketch.sketchstats import NO_STATS
+from pagebotsketch.sketchzip import readJson
+
+def newLayer(d):
+    """Answer the Sketch layer instance for the layer dict @d, letting
+    SketchPage select the class from d['_class'].
+    """
+    return SketchPage(dict(_class='page', layers=[d])).layers[0]
+
+def loadPage(path, member):
+    """Answer the SketchPage of the page @member in the .sketch file @path.
+    Top-level function, so it can run in a process pool.
+    """
+    with zipfile.ZipFile(path, mode='r') as zf:
+        return SketchPage(readJson(zf, member))
+
+def loadLayers(texts):
+    """Answer the list of Sketch layers, decoded from the JSON @texts of
+    top-level layers, as answered by sketchzip.pageLayerTexts. Top-level
+    function, so it can run in a process pool, with multiple processes
+    dividing the layers of one page. The layers get a temporary page as
+    parent, the caller sets the real one.
+    """
+    return SketchPage(dict(_class='page', layers=[json.loads(text) for text in texts])).layers
+
+class SketchLazyPage:
+    """Proxy of a SketchPage, as answered by SketchBuilder.pages in lazy mode.
+    The name and id of the page are known from meta.json. The page member is
+    unzipped and decoded on first access of self.layers (or any other
+    attribute of the real SketchPage). self.isLoaded shows if that happened.
+
+    >>> page = SketchLazyPage('Untitled.sketch', 'pages/A.json', 'A', 'Page 1')
+    >>> page
+    <SketchLazyPage name=Page 1 loaded=False>
+    >>> page.name, page.do_objectID, page.isLoaded
+    ('Page 1', 'A', False)
+    """
+    def __init__(self, path, member, pageId, name, parent=None, stats=None):
+        self.path = path # Path of the .sketch file.
+        self.member = member # Name of the page member in the zip archive.
+        self.pageId = pageId
+        self.name = name
+        self.parent = parent # Optional parent passed to the SketchPage.
+        self.stats = stats or NO_STATS # SketchStats, timing the loading.
+        self._page = None # Real SketchPage instance, after loading.
+
+    def __repr__(self):
+        return '<%s name=%s loaded=%s>' % (self.__class__.__name__, self.name, self.isLoaded)
+
+    def _get_do_objectID(self):
+        return self.pageId
+    do_objectID = property(_get_do_objectID)
+
+    def _get_isLoaded(self):
+        """Answer the boolean flag if the page member has been decoded."""
+        return self._page is not None
+    isLoaded = property(_get_isLoaded)
+
+    def load(self, zf=None):
+        """Read and decode the page member, answering the SketchPage instance.
+        Optional @zf is an open zipfile.ZipFile, to avoid opening the
+        archive again for every page. Loading only happens once.
+        """
+        if self._page is None:
+            if zf is None:
+                with zipfile.ZipFile(self.path, mode='r') as zf:
+                    d = self._readJson(zf)
+            else:
+                d = self._readJson(zf)
+            with self.stats.phase('construct', items=1):
+                self._page = SketchPage(d, self.parent)
+        return self._page
+
+    def _readJson(self, zf):
+        """Answer the decoded page member. With stats enabled, the unzip and
+        the JSON decode are timed separately.
+        """
+        stats = self.stats
+        if not stats.enabled:
+            return readJson(zf, self.member)
+        with stats.phase('unzip', items=1):
+            data = zf.read(self.member)
+        with stats.phase('decode', items=1):
+            return json.loads(data)
+
+    def setPage(self, page):
+        """Set the SketchPage instance, loaded elsewhere, e.g. by a process pool."""
+        self._page = page
+
+    def _get_page(self):
+        """Answer the real SketchPage instance, loading it if necessary."""
+        return self.load()
+    page = property(_get_page)
+
+    def _get_layers(self):
+        return self.load().layers
+    layers = property(_get_layers)
+
+    def _get_frame(self):
+        return self.load().frame
+    frame = property(_get_frame)
+
+    def __getattr__(self, attrName):
+        # Only called for attributes that are not defined by the proxy.
+        if attrName.startswith('_'):
+            raise AttributeError(attrName)
+        return getattr(self.load(), attrName)
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchspatial.py
+#
+#     Uniform grid index over the bounds of layers, to find the layers in a
+#     rectangle or at a point without testing all layers.
+#
+from math import floor, sqrt
+
+MAX_CELLS = 64 # Items covering more cells are tested on every query.
+
+class SketchGridIndex:
+    """Uniform grid over the bounding boxes of items. The @items are a list of
+    (x, y, w, h, obj) tuples, in drawing order. Queries answer the objects in
+    that same order, so the last one is on top.
+
+    >>> items = [(0, 0, 100, 100, 'background'), (10, 10, 20, 20, 'a'), (50, 50, 20, 20, 'b')]
+    >>> index = SketchGridIndex(items)
+    >>> index.query(0, 0, 40, 40)
+    ['background', 'a']
+    >>> index.query(200, 200, 10, 10)
+    []
+    >>> index.hit(15, 15), index.hit(90, 90), index.hit(-1, 0)
+    ('a', 'background', None)
+    >>> len(index)
+    3
+    """
+    def __init__(self, items, cellSize=None):
+        self.items = items
+        if cellSize is None:
+            cellSize = self._cellSize(items)
+        self.cellSize = cellSize
+        self.cells = {} # {(column, row): [itemIndex, ...]}
+        self.large = [] # Indices of items covering more than MAX_CELLS cells.
+        for index, (x, y, w, h, _) in enumerate(items):
+            c0, r0, c1, r1 = self._cellRange(x, y, w, h)
+            if (c1 - c0 + 1) * (r1 - r0 + 1) > MAX_CELLS:
+                self.large.append(index)
+                continue
+            for column in range(c0, c1+1):
+                for row in range(r0, r1+1):
+                    self.cells.setdefault((column, row), []).append(index)
+
+    def __repr__(self):
+        return '<%s items=%d cells=%d>' % (self.__class__.__name__, len(self.items), len(self.cells))
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cellSize(self, items):
+        """Answer the cell size, making the average number of items per cell
+        about one for the total area of the items.
+        """
+        if not items:
+            return 1
+        x0 = min(item[0] for item in items)
+        y0 = min(item[1] for item in items)
+        x1 = max(item[0] + item[2] for item in items)
+        y1 = max(item[1] + item[3] for item in items)
+        return max(sqrt((x1 - x0) * (y1 - y0) / len(items)), 1)
+
+    def _cellRange(self, x, y, w, h):
+        cs = self.cellSize
+        return floor(x/cs), floor(y/cs), floor((x+w)/cs), floor((y+h)/cs)
+
+    def _candidates(self, x, y, w, h):
+        c0, r0, c1, r1 = self._cellRange(x, y, w, h)
+        candidates = set(self.large)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self.cells):
+            for (column, row), indices in self.cells.items():
+                if c0 <= column <= c1 and r0 <= row <= r1:
+                    candidates.update(indices)
+        else:
+            for column in range(c0, c1+1):
+                for row in range(r0, r1+1):
+                    candidates.update(self.cells.get((column, row), ()))
+        return sorted(candidates)
+
+    def query(self, x, y, w, h):
+        """Answer the list of objects whose bounds overlap with the rectangle
+        (x, y, w, h), in drawing order.
+        """
+        result = []
+        for index in self._candidates(x, y, w, h):
+            ix, iy, iw, ih, obj = self.items[index]
+            if ix < x + w and x < ix + iw and iy < y + h and y < iy + ih:
+                result.append(obj)
+        return result
+
+    def hit(self, x, y):
+        """Answer the top-most object whose bounds contain the point (x, y),
+        or None if there is no such object.
+        """
+        for index in reversed(self._candidates(x, y, 0, 0)):
+            ix, iy, iw, ih, obj = self.items[index]
+            if ix <= x <= ix + iw and iy <= y <= iy + ih:
+                return obj
+        return None
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
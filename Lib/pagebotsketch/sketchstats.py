@@ -0,0 +1,216 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchstats.py
+#
+#     Optional instrumentation of SketchContext and SketchBuilder, recording
+#     wall time, calls and item counts per phase (parse, decode, construct,
+#     createElements, text, images, encode, zip, ...). When it is off, the
+#     instrumented code talks to NO_STATS, that does nothing.
+#
+import time
+
+class _Timer:
+    """Context manager timing one call of a phase."""
+    __slots__ = ('phase', 'items', 't')
+
+    def __init__(self, phase, items):
+        self.phase = phase
+        self.items = items
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        phase = self.phase
+        phase.seconds += time.perf_counter() - self.t
+        phase.calls += 1
+        phase.items += self.items
+        return False
+
+class SketchPhase:
+    """Totals of one phase."""
+    __slots__ = ('name', 'seconds', 'calls', 'items')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0
+        self.calls = 0
+        self.items = 0
+
+    def __repr__(self):
+        return '<%s %s %0.3fs calls=%d items=%d>' % (self.__class__.__name__, self.name,
+            self.seconds, self.calls, self.items)
+
+    def asDict(self):
+        return dict(seconds=self.seconds, calls=self.calls, items=self.items)
+
+class SketchStats:
+    """Statistics per phase of reading and writing Sketch files. Phases
+    can be nested, e.g. 'text' is part of 'createElements', so their times
+    do not add up to the total. The phases of self add up over all
+    operations, until self.reset. The optional @sink is called as
+    sink(operation, stats) at the end of every SketchContext.readDocument
+    and save, e.g. to forward the stats to a metrics system. It gets a new
+    SketchStats with only the time since the previous operation, so a sink
+    can sum what it receives.
+
+    >>> stats = SketchStats()
+    >>> with stats.phase('decode', items=3):
+    ...     pass
+    >>> with stats.phase('decode'):
+    ...     stats.count('decode', 2)
+    >>> stats['decode'].calls, stats['decode'].items
+    (2, 5)
+    >>> sorted(stats.asDict()['decode'])
+    ['calls', 'items', 'seconds']
+    >>> received = []
+    >>> stats.sink = lambda operation, stats: received.append((operation, stats['decode'].calls))
+    >>> stats.emit('readDocument')
+    >>> with stats.phase('decode'):
+    ...     pass
+    >>> stats.emit('save')
+    >>> received, stats['decode'].calls
+    ([('readDocument', 2), ('save', 1)], 3)
+    >>> stats.reset()
+    >>> stats.asDict()
+    {}
+    """
+    enabled = True
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.phases = {} # {name: SketchPhase}
+        self._emitted = {} # Totals at the previous emit {name: (seconds, calls, items)}
+
+    def __repr__(self):
+        return '<%s phases=%d>' % (self.__class__.__name__, len(self.phases))
+
+    def __getitem__(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = SketchPhase(name)
+        return phase
+
+    def phase(self, name, items=0):
+        """Answer the context manager that adds the wall time of its block
+        to the phase @name, with @items processed items.
+        """
+        return _Timer(self[name], items)
+
+    def count(self, name, items=1):
+        """Add @items to the item count of phase @name, without timing."""
+        self[name].items += items
+
+    def reset(self):
+        self.phases = {}
+        self._emitted = {}
+
+    def asDict(self):
+        """Answer the dictionary {phase: dict(seconds, calls, items)}."""
+        return {name: phase.asDict() for name, phase in self.phases.items()}
+
+    def report(self):
+        """Answer the statistics as readable string, one line per phase."""
+        return '\n'.join('%-16s %9.3fs %8d calls %10d items' % (name, phase.seconds, phase.calls, phase.items)
+            for name, phase in self.phases.items())
+
+    def since(self, totals):
+        """Answer a new SketchStats with the differences of self and the
+        @totals {name: (seconds, calls, items)}, leaving out unused phases.
+        """
+        stats = self.__class__()
+        for name, phase in self.phases.items():
+            seconds, calls, items = totals.get(name, (0, 0, 0))
+            if phase.calls != calls or phase.items != items:
+                delta = stats[name]
+                delta.seconds = phase.seconds - seconds
+                delta.calls = phase.calls - calls
+                delta.items = phase.items - items
+        return stats
+
+    def emit(self, operation):
+        """Call the sink with the @operation name and the stats of the
+        phases since the previous emit.
+        """
+        if self.sink is not None:
+            self.sink(operation, self.since(self._emitted))
+        self._emitted = {name: (phase.seconds, phase.calls, phase.items)
+            for name, phase in self.phases.items()}
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class SketchNoStats:
+    """Replacement of SketchStats when instrumentation is off. All methods
+    do nothing, answering shared empty objects.
+
+    >>> with NO_STATS.phase('decode', items=3):
+    ...     NO_STATS.count('decode')
+    >>> NO_STATS.enabled, NO_STATS.asDict()
+    (False, {})
+    """
+    enabled = False
+    sink = None
+    phases = {}
+    _timer = _NoTimer()
+
+    def __repr__(self):
+        return '<%s>' % self.__class__.__name__
+
+    def phase(self, name, items=0):
+        return self._timer
+
+    def count(self, name, items=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def asDict(self):
+        return {}
+
+    def report(self):
+        return ''
+
+    def emit(self, operation):
+        pass
+
+NO_STATS = SketchNoStats()
+
+def newStats(stats):
+    """Answer the stats instance for the @stats argument of SketchContext and
+    SketchBuilder: True for a new SketchStats, a SketchStats instance as is,
+    or NO_STATS for None or False.
+
+    >>> newStats(None) is NO_STATS, newStats(True).enabled
+    (True, True)
+    """
+    if stats is None or stats is False:
+        return NO_STATS
+    if stats is True:
+        return SketchStats()
+    return stats
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
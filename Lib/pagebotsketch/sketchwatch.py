@@ -0,0 +1,358 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchwatch.py
+#
+#     Watching a .sketch file for changes. Sketch saves by replacing the file,
+#     often several times in a row, so changes are debounced until the file
+#     is stable. Only the page members with another CRC are decoded, to tell
+#     which pages and artboards changed. Polling works everywhere, on Linux
+#     inotify (through ctypes) is used to wake up without delay.
+#
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+import zipfile
+
+from pagebotsketch.sketchcompare import hashTree
+from pagebotsketch.sketchzip import readJson, pageMembers
+
+DEFAULT_INTERVAL = 0.5 # Seconds between polls of the file.
+DEFAULT_DEBOUNCE = 0.3 # Seconds the file must be unchanged before reloading.
+
+# inotify flags, see /usr/include/linux/inotify.h
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII') # wd, mask, cookie, len
+# Errors of reading a file that is being replaced, tried again at the next poll.
+READ_ERRORS = (OSError, zipfile.BadZipFile, KeyError, ValueError)
+
+def memberCrcs(path):
+    """Answer the dictionary {member: crc} of the members in the zip
+    archive @path, only reading its central directory.
+    """
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: info.CRC for info in zf.infolist()}
+
+def artboardHashes(path, members):
+    """Answer the dictionary {artboardId: (hash, member)} for the artboards
+    in the page @members of the .sketch file @path. Raises KeyError if a
+    member does not exist.
+    """
+    hashes = {}
+    with zipfile.ZipFile(path) as zf:
+        for member in members:
+            d = readJson(zf, member)
+            if d is None:
+                raise KeyError(member)
+            for node in hashTree(d).children:
+                hashes[node.sId] = node.hash, member
+    return hashes
+
+class SketchChange:
+    """Description of a change of the watched .sketch file, as answered to
+    the callbacks of SketchWatcher. The @members are the names of the zip
+    members that were added, removed or got another CRC. The @pages and
+    @artboards are the ID's of the pages and artboards that were added,
+    removed or changed. The @builder is the new SketchBuilder, if the
+    watcher reloads a SketchContext.
+    """
+    def __init__(self, path, members, pages, artboards, builder=None):
+        self.path = path
+        self.members = members
+        self.pages = pages
+        self.artboards = artboards
+        self.builder = builder
+
+    def __repr__(self):
+        return '<%s members=%d pages=%d artboards=%d>' % (self.__class__.__name__,
+            len(self.members), len(self.pages), len(self.artboards))
+
+class _Inotify:
+    """Minimal inotify watch on the directory of a file, through ctypes.
+    Raises OSError if inotify is not available.
+    """
+    def __init__(self, path):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # Watch the directory, as saving replaces the file by another one.
+        dirPath = os.path.dirname(os.path.abspath(path)).encode(sys.getfilesystemencoding())
+        if libc.inotify_add_watch(self.fd, dirPath, INOTIFY_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+        self.fileName = os.path.basename(path).encode(sys.getfilesystemencoding())
+
+    def wait(self, timeout):
+        """Wait at most @timeout seconds for events. Answer True if one of
+        them was about the watched file.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.fd, 64*1024)
+        except BlockingIOError:
+            return False
+        found = False
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset+length].rstrip(b'\0')
+            offset += length
+            if name == self.fileName:
+                found = True
+        return found
+
+    def close(self):
+        os.close(self.fd)
+
+class SketchWatcher:
+    """Watch the .sketch file @path and call the subscribed callbacks with a
+    SketchChange after the file changed and was stable for @debounce
+    seconds. The file is polled every @interval seconds. If @useInotify is
+    None, inotify is used when available, True requires it and False only
+    polls. Call self.start to watch in a daemon thread, or call self.poll
+    from your own loop. Exceptions of callbacks do not stop the watching;
+    they are printed to stderr, counted in self.errors and the last one is
+    kept in self.lastError.
+
+    >>> import json, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'Test.sketch')
+    >>> def writeSketch(name):
+    ...     page = dict(_class='page', do_objectID='P', layers=[
+    ...         dict(_class='artboard', do_objectID='A', name=name),
+    ...         dict(_class='artboard', do_objectID='B', name='B')])
+    ...     with zipfile.ZipFile(path, 'w') as zf:
+    ...         zf.writestr('document.json', json.dumps({'pages': [{'_ref': 'pages/P'}]}))
+    ...         zf.writestr('pages/P.json', json.dumps(page))
+    ...         zf.writestr('images/a.png', b'PNG')
+    >>> writeSketch('A')
+    >>> changes = []
+    >>> watcher = SketchWatcher(path, changes.append, debounce=0, useInotify=False)
+    >>> watcher.poll()
+    False
+    >>> writeSketch('Changed')
+    >>> os.utime(path, ns=(0, 0)) # Make sure the file looks different.
+    >>> watcher.poll()
+    True
+    >>> change = changes[0]
+    >>> change, change.members, change.pages, change.artboards
+    (<SketchChange members=1 pages=1 artboards=1>, ['pages/P.json'], ['P'], ['A'])
+    """
+    def __init__(self, path, callback=None, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+            useInotify=None, reload=None):
+        self.path = path
+        self.interval = interval
+        self.debounce = debounce
+        self.reload = reload # Optional function answering a new builder.
+        self.callbacks = []
+        if callback is not None:
+            self.subscribe(callback)
+        self.inotify = None
+        if useInotify or useInotify is None:
+            try:
+                self.inotify = _Inotify(path)
+            except (OSError, AttributeError):
+                if useInotify:
+                    raise
+        self._signature = self._stat()
+        self._pending = None # Time of the last seen change, until it is handled.
+        self._thread = None
+        self._stop = threading.Event()
+        self.changes = 0 # Number of handled changes.
+        self.errors = 0 # Number of times the file could not be read or a callback failed.
+        self.lastError = None # Last exception of reading the file or of a callback.
+        self._crcs = self._artboards = None # Set by self._readState, retried by self.poll.
+        self._readState()
+
+    def __repr__(self):
+        return '<%s path=%s inotify=%s>' % (self.__class__.__name__,
+            self.path.split('/')[-1], self.inotify is not None)
+
+    def subscribe(self, callback):
+        """Add @callback, that is called with the SketchChange instance."""
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def _stat(self):
+        """Answer the tuple that changes if the file is changed or replaced."""
+        try:
+            st = os.stat(self.path)
+        except OSError: # Replaced at this moment.
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _readCrcs(self):
+        try:
+            return memberCrcs(self.path)
+        except (OSError, zipfile.BadZipFile): # Missing or still being written.
+            return None
+
+    def _pageMembers(self):
+        try:
+            return pageMembers(self.path)
+        except (OSError, zipfile.BadZipFile, ValueError):
+            return []
+
+    def _readState(self):
+        """Read the CRCs and artboard hashes to compare changes with. If the
+        file is replaced while reading, keep them None, so self.poll tries
+        again. Answer the boolean flag if the state was read.
+        """
+        crcs = self._readCrcs() or {} # A missing file has no members yet.
+        try:
+            pages = [member for member, _, _ in self._pageMembers()]
+            artboards = artboardHashes(self.path, pages) if crcs else {}
+            if crcs and self._readCrcs() != crcs:
+                raise ValueError('File changed while it was read')
+        except READ_ERRORS as e:
+            self.errors += 1
+            self.lastError = e
+            return False
+        self._crcs = crcs
+        self._artboards = artboards
+        return True
+
+    def poll(self):
+        """Check the file once. Answer True if a change was handled."""
+        if self._crcs is None and not self._readState():
+            return False # Nothing to compare with yet.
+        signature = self._stat()
+        now = time.time()
+        if signature != self._signature:
+            self._signature = signature
+            self._pending = now
+            if self.debounce:
+                return False # Wait until the file is stable.
+        if self._pending is None or now - self._pending < self.debounce:
+            return False
+        crcs = self._readCrcs()
+        if crcs is None:
+            self.errors += 1 # Try again at the next poll.
+            return False
+        self._pending = None
+        return self._handle(crcs)
+
+    def _retry(self, e):
+        """The file could not be read, e.g. it was replaced while reading.
+        Keep the old state, so the change is handled at the next poll.
+        """
+        self.errors += 1
+        self.lastError = e
+        self._pending = time.time()
+        return False
+
+    def _handle(self, crcs):
+        old = self._crcs
+        members = sorted(name for name in set(old) | set(crcs) if old.get(name) != crcs.get(name))
+        if not members:
+            self._crcs = crcs
+            return False # Same content, e.g. only touched.
+        # Decode only the page members that changed.
+        pages = []
+        changedMembers = []
+        for member in members:
+            if member.startswith('pages/') and member.endswith('.json'):
+                pages.append(member[len('pages/'):-len('.json')])
+                if member in crcs:
+                    changedMembers.append(member)
+        try:
+            current = artboardHashes(self.path, changedMembers)
+            if self._readCrcs() != crcs:
+                raise ValueError('File changed while it was read')
+        except READ_ERRORS as e:
+            return self._retry(e)
+        artboards = [sId for sId in current if self._artboards.get(sId) != current[sId]]
+        # Artboards of changed pages, that are not there anymore.
+        changed = set(members)
+        removed = [sId for sId, (_, member) in self._artboards.items()
+            if member in changed and sId not in current]
+        artboards += removed
+        builder = None
+        if self.reload is not None:
+            try:
+                builder = self.reload(self.path)
+            except READ_ERRORS as e:
+                return self._retry(e)
+        # Only now the change is seen.
+        self._crcs = crcs
+        for sId in removed:
+            del self._artboards[sId]
+        self._artboards.update(current)
+        change = SketchChange(self.path, members, pages, artboards, builder)
+        self.changes += 1
+        for callback in list(self.callbacks):
+            try:
+                callback(change)
+            except Exception as e: # Keep watching and call the other callbacks.
+                self.errors += 1
+                self.lastError = e
+                traceback.print_exc()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.inotify is not None and self._pending is None:
+                self.inotify.wait(self.interval)
+            else:
+                self._stop.wait(self.interval if self._pending is None else self.debounce)
+            try:
+                self.poll()
+            except Exception as e: # Keep watching, e.g. if the reload fails.
+                self.errors += 1
+                self.lastError = e
+                traceback.print_exc()
+
+    def start(self):
+        """Start watching in a daemon thread. Answer self."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='SketchWatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the watching thread and close the inotify watch."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
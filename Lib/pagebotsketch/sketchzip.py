@@ -0,0 +1,557 @@
+# -*- coding: UTF-8 -*-
+# -----------------------------------------------------------------------------
+#
+#     S K E T C H  C O N T E X T
+#
+#     Copyright (c) 2016+ Buro Petr van Blokland + Claudia Mens
+#     www.pagebot.io
+#     Licensed under MIT conditions
+#
+#     Supporting DrawBot, www.drawbot.com
+#     Supporting Flat, xxyxyz.org/flat
+# -----------------------------------------------------------------------------
+#
+#     sketchzip.py
+#
+#     Direct access to the members of a .sketch file, without the need to
+#     parse the whole document through SketchApi. A .sketch file is a zip
+#     archive with this layout:
+#
+#     document.json          Document info and the ordered page references
+#     meta.json              App info and the names of pages and artboards
+#     user.json              User (view) settings
+#     pages/<UUID>.json      One member per SketchPage
+#     images/<SHA-1>.<ext>   Bitmaps, named by the hash of their content
+#     previews/preview.png   Preview of the current page
+#
+#     SketchZipWriter writes a new archive, copying the unchanged members of
+#     an existing one raw, without decompressing and compressing them again.
+#
+import io
+import json
+import os
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+DOCUMENT_JSON = 'document.json'
+USER_JSON = 'user.json'
+META_JSON = 'meta.json'
+PAGES_JSON = 'pages/'
+IMAGES_JSON = 'images/'
+PREVIEWS_JSON = 'previews/'
+
+STREAM_CHUNK = 64*1024 # Initial number of characters read by JsonStream.
+COPY_BUFFER = 256*1024 # Size of the blocks in raw copies of members.
+DEFAULT_LEVEL = 6 # zlib compression level of written members.
+
+LOCAL_HEADER = struct.Struct('<4s5H3L2H') # Local file header of a zip member.
+CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L') # Central directory entry.
+END_RECORD = struct.Struct('<4s4H2LH') # End of central directory record.
+LOCAL_SIGNATURE = b'PK\x03\x04'
+CENTRAL_SIGNATURE = b'PK\x01\x02'
+END_SIGNATURE = b'PK\x05\x06'
+ZIP_VERSION = 20 # Version 2.0, deflate
+FLAG_DATA_DESCRIPTOR = 0x08 # Sizes and CRC follow the data instead of the header.
+FLAG_UTF8 = 0x800 # Member name is encoded as UTF-8.
+ZIP_LIMIT = 0xFFFFFFFF # Larger sizes and offsets need Zip64, which is not supported.
+COMPRESSED_EXTENSIONS = ('.png', '.jpg', '.jpeg') # Members that hardly deflate.
+
+# Save profiles, with the zlib level of the written members and the handling
+# of members that are already compressed (images and previews): True stores
+# them uncompressed, False deflates them, None copies them as they are.
+SAVE_PROFILES = dict(
+    fast=dict(level=1, storeCompressed=True),
+    balanced=dict(level=DEFAULT_LEVEL, storeCompressed=None),
+    smallest=dict(level=9, storeCompressed=False),
+)
+DEFAULT_PROFILE = 'balanced'
+
+def readJson(zf, member):
+    """Answer the decoded JSON of the @member in the zip archive @zf, which
+    can be an open zipfile.ZipFile or a path. Answer None if the member does
+    not exist.
+
+    >>> data = io.BytesIO()
+    >>> with zipfile.ZipFile(data, 'w') as zf:
+    ...     zf.writestr(META_JSON, '{"app": "com.bohemiancoding.sketch3"}')
+    >>> readJson(data, META_JSON)
+    {'app': 'com.bohemiancoding.sketch3'}
+    >>> readJson(data, USER_JSON) is None
+    True
+    """
+    if not isinstance(zf, zipfile.ZipFile):
+        with zipfile.ZipFile(zf, mode='r') as f:
+            return readJson(f, member)
+    if member not in zf.NameToInfo:
+        return None
+    with zf.open(member) as f:
+        return json.load(f)
+
+def pageMembers(zf):
+    """Answer the list of (member, pageId, name) tuples for all pages in the
+    zip archive @zf, in the page order of document.json. Only the small
+    document.json and meta.json members are decoded, the page members
+    themselves are not read.
+
+    >>> data = io.BytesIO()
+    >>> with zipfile.ZipFile(data, 'w') as zf:
+    ...     zf.writestr(DOCUMENT_JSON, json.dumps({'pages': [{'_ref': 'pages/B'}, {'_ref': 'pages/A'}]}))
+    ...     zf.writestr(META_JSON, json.dumps({'pagesAndArtboards': {'A': {'name': 'Page A'}, 'B': {'name': 'Page B'}}}))
+    ...     zf.writestr('pages/A.json', '{}')
+    ...     zf.writestr('pages/B.json', '{}')
+    >>> pageMembers(data)
+    [('pages/B.json', 'B', 'Page B'), ('pages/A.json', 'A', 'Page A')]
+    """
+    if not isinstance(zf, zipfile.ZipFile):
+        with zipfile.ZipFile(zf, mode='r') as f:
+            return pageMembers(f)
+    document = readJson(zf, DOCUMENT_JSON) or {}
+    meta = readJson(zf, META_JSON) or {}
+    pagesAndArtboards = meta.get('pagesAndArtboards', {})
+    refs = [ref.get('_ref') for ref in document.get('pages', [])]
+    if not refs: # No page references, fall back to the order in the archive.
+        refs = [name[:-5] for name in zf.namelist()
+            if name.startswith(PAGES_JSON) and name.endswith('.json')]
+    members = []
+    for ref in refs:
+        member = ref + '.json'
+        if member not in zf.NameToInfo:
+            continue
+        pageId = ref[len(PAGES_JSON):]
+        name = pagesAndArtboards.get(pageId, {}).get('name')
+        members.append((member, pageId, name))
+    return members
+
+class JsonStream:
+    """Incremental reader of a JSON text stream, that only keeps the part of
+    the text in memory that is needed to decode the next value. The stream
+    is walked by the caller, using the methods below, which allows to decode
+    the elements of a large list one by one.
+
+    >>> stream = JsonStream(io.StringIO('{"a": 1, "b": [10, {"c": 2}]}'), chunkSize=4)
+    >>> stream.expect('{')
+    >>> stream.decode(), stream.expect(':'), stream.decode()
+    ('a', None, 1)
+    """
+    def __init__(self, f, chunkSize=STREAM_CHUNK):
+        self.f = f # Text file object to read from.
+        self.chunkSize = chunkSize
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        """Read the next part of the stream. Answer False if the end of the
+        stream is reached. Consumed characters are dropped from the buffer.
+        """
+        if self.eof:
+            return False
+        s = self.f.read(size or self.chunkSize)
+        if not s:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + s
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip white space and comma's, answering the next character or None
+        at the end of the stream. The comma's can be skipped, as the caller
+        knows about the structure from the brackets.
+        """
+        while True:
+            while self.pos < len(self.buffer):
+                c = self.buffer[self.pos]
+                if c not in ' \t\r\n,':
+                    return c
+                self.pos += 1
+            if not self._fill():
+                return None
+
+    def expect(self, c):
+        found = self.peek()
+        if found != c:
+            raise ValueError('[%s] Expected "%s", found "%s"' % (self.__class__.__name__, c, found))
+        self.pos += 1
+
+    def decode(self):
+        """Decode and answer the next complete JSON value from the stream.
+        If the buffer does not contain the complete value, more is read, by
+        doubling the size to keep the total decoding time linear.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the stream.
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(max(self.chunkSize, len(self.buffer) - self.pos))
+
+def iterPageLayers(zf, member, header=None, chunkSize=STREAM_CHUNK):
+    """Generator that decodes the top-level layers (artboards, symbol
+    masters, groups) of a page member in the zip archive @zf one at a time,
+    straight from the decompressing zip stream. Peak memory is proportional
+    to the largest layer instead of the whole page. The layer dicts are
+    answered in the order of the page. The other attributes of the page are
+    stored in the optional @header dict, the ones after the layers only
+    after the generator is exhausted.
+
+    >>> data = io.BytesIO()
+    >>> layers = [dict(_class='artboard', name='Artboard %d' % n) for n in range(3)]
+    >>> with zipfile.ZipFile(data, 'w') as zf:
+    ...     zf.writestr('pages/A.json', json.dumps(dict(_class='page', layers=layers, name='Page 1')))
+    >>> header = {}
+    >>> for layer in iterPageLayers(data, 'pages/A.json', header, chunkSize=8):
+    ...     print(layer['name'])
+    Artboard 0
+    Artboard 1
+    Artboard 2
+    >>> header
+    {'_class': 'page', 'name': 'Page 1'}
+    """
+    if not isinstance(zf, zipfile.ZipFile):
+        with zipfile.ZipFile(zf, mode='r') as f:
+            yield from iterPageLayers(f, member, header, chunkSize)
+        return
+    if header is None:
+        header = {}
+    with zf.open(member) as f:
+        stream = JsonStream(io.TextIOWrapper(f, encoding='utf-8'), chunkSize)
+        stream.expect('{')
+        while stream.peek() != '}':
+            key = stream.decode()
+            stream.expect(':')
+            if key == 'layers':
+                stream.expect('[')
+                while stream.peek() != ']':
+                    yield stream.decode()
+                stream.expect(']')
+            else:
+                header[key] = stream.decode()
+        stream.expect('}')
+
+def _skipObject(pairs):
+    return None
+
+def pageLayerTexts(zf, member):
+    """Answer the tuple (header, texts) of the page @member in the zip
+    archive @zf, where texts is the list of JSON texts of the top-level
+    layers and header the dict with the other attributes of the page. The
+    layers are only scanned by the C decoder to find their end, without
+    building their objects, so the texts can be divided over processes that
+    each decode their own part.
+
+    >>> data = io.BytesIO()
+    >>> layers = [dict(_class='artboard', name='Artboard %d' % n, layers=[{}]) for n in range(3)]
+    >>> with zipfile.ZipFile(data, 'w') as zf:
+    ...     zf.writestr('pages/A.json', json.dumps(dict(_class='page', layers=layers, name='Page 1')))
+    >>> header, texts = pageLayerTexts(data, 'pages/A.json')
+    >>> header, [json.loads(text) for text in texts] == layers
+    ({'_class': 'page', 'name': 'Page 1'}, True)
+    """
+    if not isinstance(zf, zipfile.ZipFile):
+        with zipfile.ZipFile(zf, mode='r') as f:
+            return pageLayerTexts(f, member)
+    text = zf.read(member).decode('utf-8')
+    stream = JsonStream(io.StringIO(''))
+    stream.buffer = text # Complete text in memory, nothing to read.
+    stream.eof = True
+    scanner = json.JSONDecoder(object_pairs_hook=_skipObject)
+    header = {}
+    texts = []
+    stream.expect('{')
+    while stream.peek() != '}':
+        key = stream.decode()
+        stream.expect(':')
+        if key == 'layers':
+            stream.expect('[')
+            while stream.peek() != ']':
+                start = stream.pos
+                _, stream.pos = scanner.raw_decode(text, start)
+                texts.append(text[start:stream.pos])
+            stream.expect(']')
+        else:
+            header[key] = stream.decode()
+    stream.expect('}')
+    return header, texts
+
+def splitTexts(texts, chunks):
+    """Answer the list of at most @chunks consecutive parts of the @texts,
+    with about the same total length.
+
+    >>> splitTexts(['a' * 10, 'b', 'c', 'd' * 10, 'e'], 2)
+    [['aaaaaaaaaa', 'b', 'c'], ['dddddddddd', 'e']]
+    """
+    total = sum(len(text) for text in texts)
+    parts = []
+    part = []
+    size = 0
+    for text in texts:
+        part.append(text)
+        size += len(text)
+        if size * chunks >= total * (len(parts) + 1) and len(parts) < chunks - 1:
+            parts.append(part)
+            part = []
+    if part:
+        parts.append(part)
+    return parts
+
+def encodeJson(d):
+    """Answer the compact UTF-8 JSON encoding of @d, as written by Sketch."""
+    return json.dumps(d, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def dosDateTime(dateTime):
+    """Answer the (time, date) in MS-DOS format of the @dateTime tuple."""
+    year, month, day, hour, minute, second = dateTime[:6]
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+class SketchZipWriter:
+    """Writer of a zip archive to the binary file @f. Members are either
+    copied raw from another archive by self.copyMember, or written from
+    data by self.writeMember. Call self.close to write the central directory.
+
+    >>> src = io.BytesIO()
+    >>> with zipfile.ZipFile(src, 'w', zipfile.ZIP_DEFLATED) as zf:
+    ...     zf.writestr(META_JSON, '{"app": "com.bohemiancoding.sketch3"}')
+    ...     zf.writestr('images/a.png', b'PNG data' * 100)
+    >>> dst = io.BytesIO()
+    >>> writer = SketchZipWriter(dst)
+    >>> with zipfile.ZipFile(src) as zf:
+    ...     writer.copyMember(src, zf.getinfo('images/a.png'))
+    >>> writer.writeMember(META_JSON, encodeJson({'app': 'Other'}))
+    >>> writer.close()
+    >>> with zipfile.ZipFile(dst) as zf:
+    ...     zf.testzip(), zf.namelist(), zf.read(META_JSON)
+    (None, ['images/a.png', 'meta.json'], b'{"app":"Other"}')
+    """
+    def __init__(self, f):
+        self.f = f
+        self.entries = [] # Central directory entries, in order of the members.
+        self.rawBytes = 0 # Total bytes copied raw.
+        self.compressedBytes = 0 # Total bytes written by compressing members.
+
+    def _writeHeader(self, name, flags, method, dateTime, crc, compressSize, fileSize):
+        offset = self.f.tell()
+        if max(offset, compressSize, fileSize) > ZIP_LIMIT:
+            raise ValueError('[%s] Zip64 is not supported: %s' % (self.__class__.__name__, name))
+        encodedName = name.encode('utf-8')
+        if not name.isascii():
+            flags |= FLAG_UTF8
+        flags &= ~FLAG_DATA_DESCRIPTOR
+        dosTime, dosDate = dosDateTime(dateTime)
+        self.f.write(LOCAL_HEADER.pack(LOCAL_SIGNATURE, ZIP_VERSION, flags, method,
+            dosTime, dosDate, crc, compressSize, fileSize, len(encodedName), 0))
+        self.f.write(encodedName)
+        self.entries.append((encodedName, flags, method, dosTime, dosDate, crc, compressSize, fileSize, offset))
+
+    def copyMember(self, src, info, bufferSize=COPY_BUFFER):
+        """Copy the compressed data of the member with ZipInfo @info from the
+        open binary file @src of its archive, without decompressing it.
+        """
+        src.seek(info.header_offset)
+        header = LOCAL_HEADER.unpack(src.read(LOCAL_HEADER.size))
+        if header[0] != LOCAL_SIGNATURE:
+            raise zipfile.BadZipFile('[%s] Bad local header: %s' % (self.__class__.__name__, info.filename))
+        src.seek(header[-2] + header[-1], os.SEEK_CUR) # Skip name and extra field.
+        self._writeHeader(info.filename, info.flag_bits, info.compress_type, info.date_time,
+            info.CRC, info.compress_size, info.file_size)
+        remaining = info.compress_size
+        while remaining:
+            block = src.read(min(bufferSize, remaining))
+            if not block:
+                raise zipfile.BadZipFile('[%s] Truncated member: %s' % (self.__class__.__name__, info.filename))
+            self.f.write(block)
+            remaining -= len(block)
+        self.rawBytes += info.compress_size
+
+    def writeCompressed(self, name, data, crc, fileSize, method=zipfile.ZIP_DEFLATED, dateTime=None):
+        """Write the member @name with @data that is already compressed by
+        @method, with the @crc and @fileSize of the uncompressed data. The
+        @dateTime tuple defaults to now.
+        """
+        if dateTime is None:
+            dateTime = time.localtime()[:6]
+        self._writeHeader(name, 0, method, dateTime, crc, len(data), fileSize)
+        self.f.write(data)
+        self.compressedBytes += len(data)
+
+    def writeMember(self, name, data, method=zipfile.ZIP_DEFLATED, level=DEFAULT_LEVEL, dateTime=None):
+        """Compress and write the bytes @data as member @name."""
+        compressed, crc = compressMember(data, method, level)
+        self.writeCompressed(name, compressed, crc, len(data), method, dateTime)
+
+    def close(self):
+        """Write the central directory and the end record."""
+        start = self.f.tell()
+        for encodedName, flags, method, dosTime, dosDate, crc, compressSize, fileSize, offset in self.entries:
+            self.f.write(CENTRAL_HEADER.pack(CENTRAL_SIGNATURE, ZIP_VERSION, ZIP_VERSION, flags, method,
+                dosTime, dosDate, crc, compressSize, fileSize, len(encodedName), 0, 0, 0, 0, 0, offset))
+            self.f.write(encodedName)
+        size = self.f.tell() - start
+        self.f.write(END_RECORD.pack(END_SIGNATURE, 0, 0, len(self.entries), len(self.entries), size, start, 0))
+
+def compressMember(data, method=zipfile.ZIP_DEFLATED, level=DEFAULT_LEVEL):
+    """Answer the tuple (compressedData, crc) of the bytes @data, compressed
+    by @method, either zipfile.ZIP_DEFLATED or zipfile.ZIP_STORED.
+    """
+    crc = zlib.crc32(data)
+    if method == zipfile.ZIP_STORED:
+        return data, crc
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) # Raw deflate stream
+    return compressor.compress(data) + compressor.flush(), crc
+
+def getSaveProfile(profile=None):
+    """Answer the save profile dictionary for the name @profile, or @profile
+    itself if it already is a dictionary.
+
+    >>> getSaveProfile('fast')
+    {'level': 1, 'storeCompressed': True}
+    >>> getSaveProfile('tiny')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown save profile "tiny", use one of ['balanced', 'fast', 'smallest']
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if isinstance(profile, dict):
+        return profile
+    if profile not in SAVE_PROFILES:
+        raise ValueError('Unknown save profile "%s", use one of %s' % (profile, sorted(SAVE_PROFILES)))
+    return SAVE_PROFILES[profile]
+
+def _memberMethod(name, profile):
+    """Answer the compression method of member @name for the @profile, or
+    None if an existing member should be copied with its own method.
+    """
+    if name.lower().endswith(COMPRESSED_EXTENSIONS):
+        storeCompressed = profile['storeCompressed']
+        if storeCompressed is None:
+            return None
+        return zipfile.ZIP_STORED if storeCompressed else zipfile.ZIP_DEFLATED
+    return zipfile.ZIP_DEFLATED
+
+def rewriteArchive(srcPath, dstPath, members, order=None, profile=None, threads=None):
+    """Write the archive @dstPath as a copy of @srcPath, where @members is a
+    dictionary {name: data} of members to write with new data, or with None
+    to leave them out. All other members are copied raw, unless the save
+    @profile (see SAVE_PROFILES) needs another compression method for them.
+    The @order list of names answers the order of new members, otherwise
+    they are written after the existing ones. @dstPath can be the same as
+    @srcPath, as the archive is written into a temporary file first. Answer
+    the SketchZipWriter.
+
+    The members are compressed in a pool of @threads (zlib releases the
+    GIL), and then written in the order of the source archive, so the
+    result does not depend on the number of threads. At most 2 * @threads
+    members are read and compressed ahead of the writer, so memory does
+    not grow with the size of the images.
+
+    >>> import tempfile
+    >>> srcPath = os.path.join(tempfile.mkdtemp(), 'Test.sketch')
+    >>> with zipfile.ZipFile(srcPath, 'w', zipfile.ZIP_DEFLATED) as zf:
+    ...     zf.writestr(DOCUMENT_JSON, '{}')
+    ...     zf.writestr('pages/A.json', '{"name": "Page A"}')
+    ...     zf.writestr('pages/B.json', '{"name": "Page B"}')
+    ...     zf.writestr('images/a.png', b'PNG data')
+    >>> writer = rewriteArchive(srcPath, srcPath, {'pages/A.json': b'{"name":"Changed"}', 'pages/B.json': None, 'pages/C.json': b'{}'})
+    >>> with zipfile.ZipFile(srcPath) as zf:
+    ...     zf.namelist(), zf.read('pages/A.json')
+    (['document.json', 'pages/A.json', 'images/a.png', 'pages/C.json'], b'{"name":"Changed"}')
+    >>> with zipfile.ZipFile(srcPath) as zf:
+    ...     dateTime = zf.getinfo('images/a.png').date_time
+    >>> writer = rewriteArchive(srcPath, srcPath, {}, profile='fast')
+    >>> with zipfile.ZipFile(srcPath) as zf:
+    ...     zf.getinfo('images/a.png').compress_type == zipfile.ZIP_STORED, zf.read('images/a.png')
+    (True, b'PNG data')
+
+    Members that are only compressed again keep their date, so saving an
+    unchanged file again answers the same bytes. The writer counts the
+    bytes as written.
+
+    >>> with zipfile.ZipFile(srcPath) as zf:
+    ...     zf.getinfo('images/a.png').date_time == dateTime
+    True
+    >>> writer.compressedBytes == len(b'PNG data')
+    True
+    >>> data = open(srcPath, 'rb').read()
+    >>> _ = rewriteArchive(srcPath, srcPath, {}, profile='fast')
+    >>> open(srcPath, 'rb').read() == data
+    True
+    """
+    profile = getSaveProfile(profile)
+    level = profile['level']
+    workers = threads or os.cpu_count() or 1
+    window = 2 * workers # Maximum number of members compressed ahead of the writer.
+    dstDir = os.path.dirname(os.path.abspath(dstPath))
+    tmpPath = os.path.join(dstDir, '.%s.tmp%d' % (os.path.basename(dstPath), os.getpid()))
+    try:
+        with open(srcPath, 'rb') as src, zipfile.ZipFile(src) as zf, \
+                ThreadPoolExecutor(workers) as executor:
+            # Plan of (name, info, data, method): raw copy of info if method is
+            # None, data None is read from the source when it is compressed.
+            plan = []
+            for name in zf.namelist():
+                info = zf.getinfo(name)
+                if name in members:
+                    data = members[name]
+                    if data is None:
+                        continue
+                    plan.append((name, info, data, _memberMethod(name, profile) or info.compress_type))
+                elif _memberMethod(name, profile) in (None, info.compress_type):
+                    plan.append((name, info, None, None))
+                else: # The profile needs a different method.
+                    plan.append((name, info, None, _memberMethod(name, profile)))
+            for name in (order or members):
+                if name not in zf.NameToInfo and members.get(name) is not None:
+                    method = _memberMethod(name, profile) or zipfile.ZIP_DEFLATED
+                    plan.append((name, None, members[name], method))
+
+            def submit(index):
+                name, _, data, method = plan[index]
+                if method is None:
+                    return None
+                if data is None: # Read here, as the writer uses the same file.
+                    data = zf.read(name)
+                return executor.submit(_compressJob, data, method, level)
+
+            with open(tmpPath, 'wb') as f:
+                writer = SketchZipWriter(f)
+                futures = {} # {planIndex: future}, at most window ahead.
+                submitted = 0
+                for index, (name, info, data, _) in enumerate(plan):
+                    while submitted < len(plan) and submitted < index + window:
+                        futures[submitted] = submit(submitted)
+                        submitted += 1
+                    future = futures.pop(index)
+                    if future is None:
+                        writer.copyMember(src, info)
+                    else:
+                        compressed, crc, fileSize, method = future.result()
+                        dateTime = None # New data is dated now.
+                        if info is not None and data is None: # Same data, other method.
+                            dateTime = info.date_time
+                        writer.writeCompressed(name, compressed, crc, fileSize, method, dateTime)
+                writer.close()
+        os.replace(tmpPath, dstPath)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return writer
+
+def _compressJob(data, method, level):
+    compressed, crc = compressMember(data, method, level)
+    return compressed, crc, len(data), method
+
+if __name__ == '__main__':
+  import doctest
+  import sys
+  sys.exit(doctest.testmod()[0])
@@ -36,6 +36,7 @@ from pagebot.toolbox.color import color
 from pagebot.toolbox.units import pt
 from pagebot.toolbox.transformer import path2Dir, path2Extension, asNumber
 from pagebot.elements import *
+from pagebotsketch.sketchimages import extractImages
 
 VERBOSE = False
 
@@ -1098,14 +1099,10 @@ class SketchContext(BaseContext):
                 self._SketchPage2Document(sketchPage, doc)
         #print(self.imagesId2Path)
 
-        # Now scan images and save them as file in _local, preferrably with their original name.
-        for key in zipInfo:
-            if key.startswith(IMAGES_JSON): # This must be an image
-                imageBinary = f.read(key)
-                localImagePath = self.imagesId2Path.get(key, key.split('/')[-1])
-                fh = open(localImagePath, 'wb')
-                fh.write(imageBinary)
-                fh.close()
+        # Now save the images as file in _local, preferrably with their original name.
+        # Images that are already there with the same content are skipped.
+        names = {ref: os.path.basename(imagePath) for ref, imagePath in self.imagesId2Path.items()}
+        extractImages(path, self.imagesPath, names)
 
         """
             elif infoName.startswith(PREVIEWS_JSON):
@@ -54,5 +54,10 @@ setup(
         'Topic :: Text Processing :: Fonts'],
     install_requires=[
         'pagebot',
-        ]
+        ],
+    entry_points={
+        'console_scripts': [
+            'pagebotsketch-convert=pagebotsketch.convert:main',
+            ],
+        },
 )